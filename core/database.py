@@ -3,21 +3,136 @@ Database layer for TaleKeeper - manages characters, encounters, and game state.
 Uses SQLite for persistence with JSON columns for flexible data storage.
 """
 
+import atexit
+import queue
 import sqlite3
-import json
+import threading
+import orjson
 import uuid
+import weakref
 from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass, asdict
 from datetime import datetime
 from pathlib import Path
 import logging
+from contextlib import contextmanager
+
+import numpy as np
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Databases not yet closed; weak so the exit hook never keeps a manager alive
+_open_databases: "weakref.WeakSet[DatabaseManager]" = weakref.WeakSet()
+
+
+@atexit.register
+def _close_open_databases():
+    """Close every database still open at interpreter exit"""
+    for db in list(_open_databases):
+        db.close()
+
+
+# JSON columns are stored as compact TEXT (no separator whitespace): smaller rows and
+# less to parse on every read. SQLite's binary JSONB needs 3.45+, newer than many
+# bundled Python builds, and a JSONB file would be unreadable on older ones.
+# orjson output is already compact and (de)serializes several times faster than json.
+_load_json = orjson.loads
+
+
+def _dump_json(value: Any) -> str:
+    """Serialize a JSON column value compactly"""
+    return orjson.dumps(value).decode()
+
+
+# Hot-path SQL kept as module constants so every call hands SQLite the exact same
+# text and hits the connection's prepared-statement cache instead of re-parsing.
+_CHARACTER_COLUMNS = (
+    "id, name, player_name, character_class, level, hp_current, hp_max, ac, stats, modifiers, "
+    "proficiency_bonus, saving_throws, skills, equipment, spells, background, alignment, notes, "
+    "created_at, updated_at"
+)
+_ENCOUNTER_COLUMNS = (
+    "id, name, description, active, round_number, current_turn, participants, initiative_order, "
+    "created_at, updated_at"
+)
+
+# Single-row combat log writes are staged in an attached in-memory database and
+# moved to disk in one transaction once this many are pending, or at the latest
+# every COMBAT_LOG_FLUSH_INTERVAL seconds
+COMBAT_LOG_FLUSH_SIZE = 64
+COMBAT_LOG_FLUSH_INTERVAL = 5.0
+
+# Read-only connections shared by lookups, alongside the single writer connection
+READ_POOL_SIZE = 4
+
+# Hot JSON fields exposed as virtual generated columns so they can be filtered
+# and indexed without decoding the JSON in Python. Added via ALTER TABLE so
+# databases created before these columns existed pick them up too.
+_GENERATED_CHARACTER_COLUMNS = {
+    "str_mod": "json_extract(modifiers, '$.STR')",
+    "dex_mod": "json_extract(modifiers, '$.DEX')",
+    "con_mod": "json_extract(modifiers, '$.CON')",
+    "int_mod": "json_extract(modifiers, '$.INT')",
+    "wis_mod": "json_extract(modifiers, '$.WIS')",
+    "cha_mod": "json_extract(modifiers, '$.CHA')",
+}
+
+_SQL_INSERT_CHARACTER = "INSERT INTO characters VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+_SQL_GET_CHAR = f"SELECT {_CHARACTER_COLUMNS} FROM characters WHERE id = ?"
+_SQL_GET_CHAR_BY_NAME = f"SELECT {_CHARACTER_COLUMNS} FROM characters WHERE name = ?"
+# Placeholders filled per call; oldest row first so duplicates resolve like get_character_by_name
+_SQL_GET_CHARS_BY_NAMES = f"SELECT {_CHARACTER_COLUMNS} FROM characters WHERE name IN ({{}}) ORDER BY rowid"
+_SQL_GET_CHAR_IDS_BY_NAMES = "SELECT id, name FROM characters WHERE name IN ({}) ORDER BY rowid"
+_SQL_GET_CHAR_HP = "SELECT hp_current, hp_max FROM characters WHERE id = ?"
+_SQL_LIST_CHARS = f"SELECT {_CHARACTER_COLUMNS} FROM characters ORDER BY name"
+_SQL_LIST_CHAR_SUMMARIES = "SELECT name, character_class, level, hp_current, hp_max, ac FROM characters ORDER BY name"
+_SQL_UPDATE_HP = "UPDATE characters SET hp_current = ?, updated_at = ? WHERE id = ?"
+# Clamp in SQL so damage/heal is one statement instead of a read-modify-write (SQLite 3.35+)
+_SQL_DAMAGE = (
+    "UPDATE characters SET hp_current = MAX(0, hp_current - ?), updated_at = ? "
+    "WHERE id = ? RETURNING hp_current"
+)
+_SQL_HEAL = (
+    "UPDATE characters SET hp_current = MIN(hp_max, hp_current + ?), updated_at = ? "
+    "WHERE id = ? RETURNING hp_current"
+)
+_SQL_INSERT_ENCOUNTER = "INSERT INTO encounters VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+# Nothing deactivates old encounters yet, so the newest active one is the current one
+_SQL_GET_ACTIVE_ENCOUNTER = (
+    f"SELECT {_ENCOUNTER_COLUMNS} FROM encounters WHERE active = 1 "
+    "ORDER BY created_at DESC LIMIT 1"
+)
+_SQL_INSERT_EXPERIENCE = "INSERT INTO experience_log VALUES (?, ?, ?, ?, ?, ?, ?)"
+_SQL_DELETE_INITIATIVE = "DELETE FROM initiative_entries WHERE encounter_id = ?"
+_SQL_INSERT_INITIATIVE = "INSERT INTO initiative_entries VALUES (?, ?, ?)"
+_SQL_GET_INITIATIVE = """
+    SELECT character_id, initiative FROM initiative_entries
+    WHERE encounter_id = ?
+    ORDER BY initiative DESC
+"""
+_SQL_INSERT_COMBAT_LOG = "INSERT INTO main.combat_log VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+_SQL_STAGE_COMBAT_LOG = "INSERT INTO combat_mem.combat_log VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+_SQL_PERSIST_COMBAT_LOG = "INSERT INTO main.combat_log SELECT * FROM combat_mem.combat_log"
+_SQL_PERSIST_STAGED_ROW = "INSERT INTO main.combat_log SELECT * FROM combat_mem.combat_log WHERE id = ?"
+_SQL_LIST_STAGED_IDS = "SELECT id FROM combat_mem.combat_log ORDER BY rowid"
+_SQL_CLEAR_STAGED_COMBAT_LOG = "DELETE FROM combat_mem.combat_log"
+# The staging table has no foreign keys, so log_combat_action checks them itself
+_SQL_COMBAT_LOG_REFS_EXIST = (
+    "SELECT EXISTS(SELECT 1 FROM main.encounters WHERE id = ?) "
+    "AND (? IS NULL OR EXISTS(SELECT 1 FROM main.characters WHERE id = ?))"
+)
+_SQL_GET_COMBAT_LOG = """
+    SELECT cl.*, c.name as character_name
+    FROM combat_log cl
+    LEFT JOIN characters c ON cl.character_id = c.id
+    WHERE cl.encounter_id = ?
+    ORDER BY cl.timestamp
+"""
+
 
-@dataclass
+@dataclass(slots=True)
 class Character:
     """Character data structure"""
     id: str
@@ -42,7 +157,7 @@ class Character:
     updated_at: datetime
 
 
-@dataclass
+@dataclass(slots=True)
 class Encounter:
     """Combat encounter data"""
     id: str
@@ -57,7 +172,7 @@ class Encounter:
     updated_at: datetime
 
 
-@dataclass
+@dataclass(slots=True)
 class ExperienceEntry:
     """Experience point tracking"""
     id: str
@@ -75,12 +190,90 @@ class DatabaseManager:
     def __init__(self, db_path: str = "data/talekeeper.db"):
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(exist_ok=True)
+        
+        # One long-lived connection shared by every method; writes are serialized by the lock
+        self._lock = threading.RLock()
+        self._conn = self._connect()
+        # Bumped on every character write so callers can cache derived views
+        self.db_version = 0
         self._init_database()
+        
+        # Read-only connections for lookups; under WAL they read while the writer commits.
+        # An in-memory database is private to its connection, so it reads through the writer.
+        self._readers: Optional[queue.Queue] = None
+        if str(self.db_path) != ":memory:":
+            self._readers = queue.Queue()
+            for _ in range(READ_POOL_SIZE):
+                conn = self._connect()
+                conn.execute("PRAGMA query_only = ON")
+                self._readers.put(conn)
+        
+        # Background thread moving staged combat log rows to disk
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_combat_log_loop, daemon=True)
+        self._flusher.start()
+        _open_databases.add(self)
+    
+    def close(self):
+        """Flush pending combat log rows and close the database connection"""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        _open_databases.discard(self)
+        self._flusher.join()
+        self.flush_combat_log()
+        with self._lock:
+            self._conn.close()
+        if self._readers is not None:
+            for _ in range(READ_POOL_SIZE):
+                self._readers.get().close()
+    
+    @contextmanager
+    def _transaction(self):
+        """Run several statements as one transaction on the shared connection"""
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+    
+    @contextmanager
+    def _reader(self):
+        """Borrow a pooled read-only connection (the shared writer for in-memory databases)"""
+        if self._readers is None:
+            with self._lock:
+                yield self._conn
+            return
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection with the per-connection PRAGMAs applied"""
+        # Autocommit mode: every statement runs in its own implicit transaction
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None,
+                               cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute("PRAGMA synchronous = NORMAL")  # safe with WAL, no fsync per commit
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA cache_size = -64000")  # 64MB page cache
+        conn.execute("PRAGMA mmap_size = 268435456")  # 256MB
+        conn.execute("PRAGMA busy_timeout = 5000")
+        return conn
     
     def _init_database(self):
         """Initialize database tables"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("PRAGMA foreign_keys = ON")
+        with self._lock:
+            conn = self._conn
+            # WAL is persistent in the database file, so it only needs setting once
+            conn.execute("PRAGMA journal_mode = WAL")
             
             # Characters table
             conn.execute("""
@@ -108,6 +301,14 @@ class DatabaseManager:
                 )
             """)
             
+            existing = {row["name"] for row in conn.execute("PRAGMA table_xinfo(characters)")}
+            for column, expression in _GENERATED_CHARACTER_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f"""
+                        ALTER TABLE characters ADD COLUMN {column} INTEGER
+                        GENERATED ALWAYS AS ({expression}) VIRTUAL
+                    """)
+            
             # Encounters table
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS encounters (
@@ -157,30 +358,123 @@ class DatabaseManager:
                 )
             """)
             
-            conn.commit()
+            # In-memory staging copy of combat_log: same columns, but no foreign keys
+            # since SQLite cannot reference tables in another attached database
+            conn.execute("ATTACH DATABASE ':memory:' AS combat_mem")
+            conn.execute("""
+                CREATE TABLE combat_mem.combat_log (
+                    id TEXT PRIMARY KEY,
+                    encounter_id TEXT NOT NULL,
+                    character_id TEXT,
+                    action_type TEXT NOT NULL,
+                    target_id TEXT,
+                    roll_data TEXT,
+                    damage INTEGER DEFAULT 0,
+                    description TEXT NOT NULL,
+                    round_number INTEGER NOT NULL,
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            self._staged_combat_rows = 0
+            
+            # Initiative order, one row per participant, read back highest first
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS initiative_entries (
+                    encounter_id TEXT NOT NULL,
+                    character_id TEXT NOT NULL,
+                    initiative INTEGER NOT NULL,
+                    PRIMARY KEY (encounter_id, character_id),
+                    FOREIGN KEY (encounter_id) REFERENCES encounters (id),
+                    FOREIGN KEY (character_id) REFERENCES characters (id)
+                )
+            """)
+            
+            # Name lookups (get_character_by_name). Not UNIQUE: existing databases
+            # may already hold duplicate names and would fail to open.
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_characters_name ON characters(name)")
+            
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_characters_level ON characters(level)")
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_characters_class
+                ON characters(character_class, level)
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_initiative_order
+                ON initiative_entries(encounter_id, initiative DESC)
+            """)
+            
+            # Combat log pulls filter on encounter_id and sort by timestamp; the extra
+            # columns let summary scans stay inside the index (SQLite has no INCLUDE)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_combat_log_cover
+                ON combat_log(encounter_id, timestamp, action_type, character_id, damage)
+            """)
+            
+            # Only active encounters are indexed, newest first, so the lookup stays one
+            # tiny index read no matter how much encounter history accumulates
+            conn.execute("DROP INDEX IF EXISTS idx_encounters_active")
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_encounters_active_created
+                ON encounters(created_at DESC) WHERE active = 1
+            """)
+            
             logger.info("Database initialized successfully")
     
     def create_character(self, character_data: Dict[str, Any]) -> Character:
         """Create a new character"""
+        character = self._build_character(character_data)
+        
+        with self._lock:
+            conn = self._conn
+            conn.execute(_SQL_INSERT_CHARACTER, self._character_row(character))
+            self.db_version += 1
+        
+        logger.info(f"Created character: {character.name} (ID: {character.id})")
+        return character
+    
+    def create_characters_bulk(self, party: List[Dict[str, Any]]) -> List[Character]:
+        """Create several characters (e.g. a whole party) in one transaction"""
+        characters = [self._build_character(character_data) for character_data in party]
+        
+        with self._transaction() as conn:
+            conn.executemany(_SQL_INSERT_CHARACTER, map(self._character_row, characters))
+            self.db_version += 1
+        
+        logger.info(f"Created {len(characters)} characters: {', '.join(c.name for c in characters)}")
+        return characters
+    
+    def _build_character(self, character_data: Dict[str, Any]) -> Character:
+        """Build a new Character from creation data, without storing it"""
         char_id = str(uuid.uuid4())
         now = datetime.now()
         
-        # Calculate modifiers from stats
+        # Calculate modifiers from stats; the six abilities are fixed, so compute each
+        # once and build the dicts as literals (missing scores count as 10)
         stats = character_data.get('stats', {})
-        modifiers = {stat: (value - 10) // 2 for stat, value in stats.items()}
+        get_score = stats.get
+        str_mod = (get_score('STR', 10) - 10) // 2
+        dex_mod = (get_score('DEX', 10) - 10) // 2
+        con_mod = (get_score('CON', 10) - 10) // 2
+        int_mod = (get_score('INT', 10) - 10) // 2
+        wis_mod = (get_score('WIS', 10) - 10) // 2
+        cha_mod = (get_score('CHA', 10) - 10) // 2
+        
+        modifiers = {'STR': str_mod, 'DEX': dex_mod, 'CON': con_mod,
+                     'INT': int_mod, 'WIS': wis_mod, 'CHA': cha_mod}
         
         # Default saving throws (base modifiers, no proficiency)
-        saving_throws = modifiers.copy()
+        saving_throws = {'STR': str_mod, 'DEX': dex_mod, 'CON': con_mod,
+                         'INT': int_mod, 'WIS': wis_mod, 'CHA': cha_mod}
         
         # Default skills (DEX-based skills as examples)
         skills = {
-            'Acrobatics': modifiers.get('DEX', 0),
-            'Athletics': modifiers.get('STR', 0),
-            'Insight': modifiers.get('WIS', 0),
-            'Investigation': modifiers.get('INT', 0),
-            'Perception': modifiers.get('WIS', 0),
-            'Persuasion': modifiers.get('CHA', 0),
-            'Stealth': modifiers.get('DEX', 0),
+            'Acrobatics': dex_mod,
+            'Athletics': str_mod,
+            'Insight': wis_mod,
+            'Investigation': int_mod,
+            'Perception': wis_mod,
+            'Persuasion': cha_mod,
+            'Stealth': dex_mod,
         }
         
         character = Character(
@@ -206,27 +500,24 @@ class DatabaseManager:
             updated_at=now
         )
         
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("""
-                INSERT INTO characters VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                character.id, character.name, character.player_name, character.character_class,
-                character.level, character.hp_current, character.hp_max, character.ac,
-                json.dumps(character.stats), json.dumps(character.modifiers),
-                character.proficiency_bonus, json.dumps(character.saving_throws),
-                json.dumps(character.skills), json.dumps(character.equipment),
-                json.dumps(character.spells), character.background, character.alignment,
-                character.notes, character.created_at, character.updated_at
-            ))
-            conn.commit()
-        
-        logger.info(f"Created character: {character.name} (ID: {char_id})")
         return character
     
+    def _character_row(self, character: Character) -> Tuple:
+        """Build the characters table row for a Character"""
+        return (
+            character.id, character.name, character.player_name, character.character_class,
+            character.level, character.hp_current, character.hp_max, character.ac,
+            _dump_json(character.stats), _dump_json(character.modifiers),
+            character.proficiency_bonus, _dump_json(character.saving_throws),
+            _dump_json(character.skills), _dump_json(character.equipment),
+            _dump_json(character.spells), character.background, character.alignment,
+            character.notes, character.created_at, character.updated_at
+        )
+    
     def get_character(self, character_id: str) -> Optional[Character]:
         """Get character by ID"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute("SELECT * FROM characters WHERE id = ?", (character_id,))
+        with self._reader() as conn:
+            cursor = conn.execute(_SQL_GET_CHAR, (character_id,))
             row = cursor.fetchone()
             
             if not row:
@@ -236,8 +527,8 @@ class DatabaseManager:
     
     def get_character_by_name(self, name: str) -> Optional[Character]:
         """Get character by name"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute("SELECT * FROM characters WHERE name = ?", (name,))
+        with self._reader() as conn:
+            cursor = conn.execute(_SQL_GET_CHAR_BY_NAME, (name,))
             row = cursor.fetchone()
             
             if not row:
@@ -245,52 +536,118 @@ class DatabaseManager:
             
             return self._row_to_character(row)
     
+    def get_characters_by_names(self, names: List[str]) -> Dict[str, Character]:
+        """Get several characters by name in one query; missing names are absent from the result"""
+        unique = list(dict.fromkeys(names))
+        if not unique:
+            return {}
+        
+        sql = _SQL_GET_CHARS_BY_NAMES.format(",".join("?" * len(unique)))
+        with self._reader() as conn:
+            cursor = conn.execute(sql, unique)
+            characters = {}
+            for row in cursor.fetchall():
+                if row["name"] not in characters:
+                    characters[row["name"]] = self._row_to_character(row)
+            return characters
+    
+    def get_character_ids_by_names(self, names: List[str]) -> Dict[str, str]:
+        """Resolve names to character IDs in one query without decoding full rows"""
+        unique = list(dict.fromkeys(names))
+        if not unique:
+            return {}
+        
+        sql = _SQL_GET_CHAR_IDS_BY_NAMES.format(",".join("?" * len(unique)))
+        with self._reader() as conn:
+            ids = {}
+            for row in conn.execute(sql, unique):
+                ids.setdefault(row["name"], row["id"])
+            return ids
+    
+    def get_character_hp(self, character_id: str) -> Optional[Tuple[int, int]]:
+        """Get (hp_current, hp_max) without decoding the rest of the character"""
+        with self._reader() as conn:
+            row = conn.execute(_SQL_GET_CHAR_HP, (character_id,)).fetchone()
+            
+            if not row:
+                return None
+            
+            return row["hp_current"], row["hp_max"]
+    
     def list_characters(self) -> List[Character]:
         """List all characters"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute("SELECT * FROM characters ORDER BY name")
+        with self._reader() as conn:
+            cursor = conn.execute(_SQL_LIST_CHARS)
             return [self._row_to_character(row) for row in cursor.fetchall()]
     
+    def list_characters_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        List every character's summary columns as arrays, one per column (ordered by name)
+        
+        Returns name, character_class, level, hp_current, hp_max and ac without
+        decoding the JSON columns.
+        """
+        with self._reader() as conn:
+            rows = conn.execute(_SQL_LIST_CHAR_SUMMARIES).fetchall()
+        
+        names, classes, level, hp_current, hp_max, ac = zip(*rows) if rows else ((),) * 6
+        return {
+            "name": np.array(names, dtype=object),
+            "character_class": np.array(classes, dtype=object),
+            "level": np.array(level, dtype=np.int64),
+            "hp_current": np.array(hp_current, dtype=np.int64),
+            "hp_max": np.array(hp_max, dtype=np.int64),
+            "ac": np.array(ac, dtype=np.int64)
+        }
+    
     def update_character_hp(self, character_id: str, new_hp: int) -> bool:
         """Update character's current HP"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute("""
-                UPDATE characters 
-                SET hp_current = ?, updated_at = ? 
-                WHERE id = ?
-            """, (new_hp, datetime.now(), character_id))
+        with self._lock:
+            conn = self._conn
+            cursor = conn.execute(_SQL_UPDATE_HP, (new_hp, datetime.now(), character_id))
             
             success = cursor.rowcount > 0
             if success:
-                conn.commit()
+                self.db_version += 1
                 logger.info(f"Updated character {character_id} HP to {new_hp}")
             
             return success
     
     def damage_character(self, character_id: str, damage: int) -> Tuple[bool, int]:
         """Apply damage to character, returns (success, new_hp)"""
-        character = self.get_character(character_id)
-        if not character:
-            return False, 0
-        
-        new_hp = max(0, character.hp_current - damage)
-        success = self.update_character_hp(character_id, new_hp)
-        
-        return success, new_hp
+        return self._apply_hp_change(_SQL_DAMAGE, character_id, damage)
     
     def heal_character(self, character_id: str, healing: int) -> Tuple[bool, int]:
         """Heal character, returns (success, new_hp)"""
-        character = self.get_character(character_id)
-        if not character:
-            return False, 0
+        return self._apply_hp_change(_SQL_HEAL, character_id, healing)
+    
+    def _apply_hp_change(self, sql: str, character_id: str, amount: int) -> Tuple[bool, int]:
+        """Run a clamped HP UPDATE ... RETURNING, returns (success, new_hp)"""
+        with self._lock:
+            conn = self._conn
+            # fetchall() steps the statement to completion so the autocommit write lands
+            rows = conn.execute(sql, (amount, datetime.now(), character_id)).fetchall()
+            
+            if not rows:
+                return False, 0
+            
+            new_hp = rows[0]["hp_current"]
+            self.db_version += 1
+            logger.info(f"Updated character {character_id} HP to {new_hp}")
+            return True, new_hp
+    
+    def create_encounter(self, name: str, description: str = "", participants: List[str] = None,
+                         initiative_order: List[Tuple[str, int]] = None) -> Encounter:
+        """
+        Create a new encounter
         
-        new_hp = min(character.hp_max, character.hp_current + healing)
-        success = self.update_character_hp(character_id, new_hp)
+        Args:
+            initiative_order: Optional (character_id, initiative) pairs, stored in the
+                same transaction so the encounter never exists without them
+        """
+        # Persist the previous encounter's staged combat log before a new one starts
+        self.flush_combat_log()
         
-        return success, new_hp
-    
-    def create_encounter(self, name: str, description: str = "", participants: List[str] = None) -> Encounter:
-        """Create a new encounter"""
         encounter_id = str(uuid.uuid4())
         now = datetime.now()
         
@@ -307,30 +664,49 @@ class DatabaseManager:
             updated_at=now
         )
         
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("""
-                INSERT INTO encounters VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
+        with self._transaction() as conn:
+            conn.execute(_SQL_INSERT_ENCOUNTER, (
                 encounter.id, encounter.name, encounter.description, encounter.active,
                 encounter.round_number, encounter.current_turn,
-                json.dumps(encounter.participants), json.dumps(encounter.initiative_order),
+                _dump_json(encounter.participants), _dump_json(encounter.initiative_order),
                 encounter.created_at, encounter.updated_at
             ))
-            conn.commit()
+            if initiative_order:
+                conn.executemany(_SQL_INSERT_INITIATIVE, (
+                    (encounter_id, character_id, initiative)
+                    for character_id, initiative in initiative_order
+                ))
         
         logger.info(f"Created encounter: {name} (ID: {encounter_id})")
         return encounter
     
     def get_active_encounter(self) -> Optional[Encounter]:
         """Get the currently active encounter"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute("SELECT * FROM encounters WHERE active = 1 LIMIT 1")
-            row = cursor.fetchone()
-            
-            if not row:
-                return None
-            
-            return self._row_to_encounter(row)
+        with self._reader() as conn:
+            row = conn.execute(_SQL_GET_ACTIVE_ENCOUNTER).fetchone()
+        
+        if not row:
+            return None
+        
+        # Outside the with block: holding one pooled connection while borrowing another could deadlock
+        encounter = self._row_to_encounter(row)
+        encounter.initiative_order = self.get_initiative_order(encounter.id)
+        return encounter
+    
+    def set_initiative_order(self, encounter_id: str, initiative_order: List[Tuple[str, int]]):
+        """Replace the stored initiative order for an encounter"""
+        with self._transaction() as conn:
+            conn.execute(_SQL_DELETE_INITIATIVE, (encounter_id,))
+            conn.executemany(_SQL_INSERT_INITIATIVE, (
+                (encounter_id, character_id, initiative)
+                for character_id, initiative in initiative_order
+            ))
+    
+    def get_initiative_order(self, encounter_id: str) -> List[Tuple[str, int]]:
+        """Get (character_id, initiative) pairs for an encounter, highest first"""
+        with self._reader() as conn:
+            cursor = conn.execute(_SQL_GET_INITIATIVE, (encounter_id,))
+            return [(row["character_id"], row["initiative"]) for row in cursor.fetchall()]
     
     def add_experience(self, character_id: str, xp_gained: int, source: str, 
                       description: str = "", encounter_id: str = None) -> ExperienceEntry:
@@ -348,70 +724,162 @@ class DatabaseManager:
             timestamp=now
         )
         
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("""
-                INSERT INTO experience_log VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
+        with self._lock:
+            conn = self._conn
+            conn.execute(_SQL_INSERT_EXPERIENCE, (
                 entry.id, entry.character_id, entry.encounter_id,
                 entry.xp_gained, entry.source, entry.description, entry.timestamp
             ))
-            conn.commit()
         
         logger.info(f"Added {xp_gained} XP to character {character_id} from {source}")
         return entry
     
+    def bulk_add_experience(self, character_ids: List[str], xp_gained: int, source: str,
+                            description: str = "", encounter_id: str = None) -> List[ExperienceEntry]:
+        """Add the same experience award to several characters in one transaction"""
+        now = datetime.now()
+        entries = [
+            ExperienceEntry(
+                id=str(uuid.uuid4()),
+                character_id=character_id,
+                encounter_id=encounter_id,
+                xp_gained=xp_gained,
+                source=source,
+                description=description,
+                timestamp=now
+            )
+            for character_id in character_ids
+        ]
+        
+        with self._transaction() as conn:
+            conn.executemany(_SQL_INSERT_EXPERIENCE, [
+                (entry.id, entry.character_id, entry.encounter_id,
+                 entry.xp_gained, entry.source, entry.description, entry.timestamp)
+                for entry in entries
+            ])
+        
+        logger.info(f"Added {xp_gained} XP to {len(entries)} characters from {source}")
+        return entries
+    
     def log_combat_action(self, encounter_id: str, character_id: str, action_type: str,
                          description: str, roll_data: Dict = None, damage: int = 0,
                          target_id: str = None, round_number: int = 1):
-        """Log a combat action"""
-        action_id = str(uuid.uuid4())
+        """
+        Log a combat action (staged in memory, persisted by flush_combat_log)
         
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("""
-                INSERT INTO combat_log VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                action_id, encounter_id, character_id, action_type, target_id,
-                json.dumps(roll_data or {}), damage, description, round_number,
-                datetime.now()
-            ))
-            conn.commit()
+        Raises:
+            ValueError: If the encounter or character does not exist
+        """
+        row = self._combat_log_row(
+            encounter_id, character_id, action_type, description,
+            roll_data, damage, target_id, round_number
+        )
+        
+        with self._lock:
+            refs = (encounter_id, character_id, character_id)
+            if not self._conn.execute(_SQL_COMBAT_LOG_REFS_EXIST, refs).fetchone()[0]:
+                raise ValueError(f"Unknown encounter or character for combat log: {encounter_id}, {character_id}")
+            self._conn.execute(_SQL_STAGE_COMBAT_LOG, row)
+            self._staged_combat_rows += 1
+            if self._staged_combat_rows >= COMBAT_LOG_FLUSH_SIZE:
+                self.flush_combat_log()
+    
+    def log_combat_actions_batch(self, actions: List[Dict[str, Any]]):
+        """
+        Log several combat actions in one transaction
+        
+        Args:
+            actions: Dicts with the same keys as log_combat_action's arguments
+        """
+        rows = [self._combat_log_row(**action) for action in actions]
+        with self._transaction() as conn:
+            conn.executemany(_SQL_INSERT_COMBAT_LOG, rows)
+    
+    def flush_combat_log(self):
+        """
+        Move staged combat log rows to the on-disk table in a single transaction
+        
+        If the bulk move violates a constraint, rows are moved one at a time and
+        only the offending ones are dropped (and logged). On any other error the
+        rows stay staged for the next flush.
+        """
+        with self._lock:
+            if not self._staged_combat_rows:
+                return
+            
+            try:
+                with self._transaction() as conn:
+                    conn.execute(_SQL_PERSIST_COMBAT_LOG)
+            except sqlite3.IntegrityError:
+                self._persist_staged_rows_individually()
+            
+            self._conn.execute(_SQL_CLEAR_STAGED_COMBAT_LOG)
+            self._staged_combat_rows = 0
+    
+    def _persist_staged_rows_individually(self):
+        """Move staged combat log rows one by one, dropping those that violate a constraint"""
+        with self._transaction() as conn:
+            for (row_id,) in conn.execute(_SQL_LIST_STAGED_IDS).fetchall():
+                try:
+                    conn.execute(_SQL_PERSIST_STAGED_ROW, (row_id,))
+                except sqlite3.IntegrityError as e:
+                    logger.error(f"Dropping combat log row {row_id}: {e}")
+    
+    def _flush_combat_log_loop(self):
+        """Background loop flushing the combat log buffer until close()"""
+        while not self._closed.wait(COMBAT_LOG_FLUSH_INTERVAL):
+            try:
+                self.flush_combat_log()
+            except sqlite3.Error as e:
+                logger.error(f"Failed to flush combat log: {e}")
+    
+    def _combat_log_row(self, encounter_id: str, character_id: str, action_type: str,
+                        description: str, roll_data: Dict = None, damage: int = 0,
+                        target_id: str = None, round_number: int = 1) -> Tuple:
+        """Build a combat_log row tuple"""
+        return (
+            str(uuid.uuid4()), encounter_id, character_id, action_type, target_id,
+            _dump_json(roll_data or {}), damage, description, round_number,
+            datetime.now()
+        )
     
     def get_combat_log(self, encounter_id: str) -> List[Dict]:
         """Get combat log for an encounter"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute("""
-                SELECT cl.*, c.name as character_name
-                FROM combat_log cl
-                LEFT JOIN characters c ON cl.character_id = c.id
-                WHERE cl.encounter_id = ?
-                ORDER BY cl.timestamp
-            """, (encounter_id,))
+        self.flush_combat_log()
+        with self._lock:
+            conn = self._conn
+            cursor = conn.execute(_SQL_GET_COMBAT_LOG, (encounter_id,))
             
-            return [dict(zip([col[0] for col in cursor.description], row)) 
-                   for row in cursor.fetchall()]
+            # Rows are sqlite3.Row already; iterating the cursor directly avoids holding
+            # a fetchall() list alongside the result. Not a generator, since the shared
+            # connection must not be left mid-read once the lock is released.
+            return [dict(row) for row in cursor]
     
     def _row_to_character(self, row) -> Character:
         """Convert database row to Character object"""
+        # One unpack in _CHARACTER_COLUMNS order plus positional construction is much
+        # cheaper than twenty keyed Row lookups and keyword arguments per row
+        (char_id, name, player_name, character_class, level, hp_current, hp_max, ac,
+         stats, modifiers, proficiency_bonus, saving_throws, skills, equipment, spells,
+         background, alignment, notes, created_at, updated_at) = row
+        loads = _load_json
         return Character(
-            id=row[0], name=row[1], player_name=row[2], character_class=row[3],
-            level=row[4], hp_current=row[5], hp_max=row[6], ac=row[7],
-            stats=json.loads(row[8]), modifiers=json.loads(row[9]),
-            proficiency_bonus=row[10], saving_throws=json.loads(row[11]),
-            skills=json.loads(row[12]), equipment=json.loads(row[13]),
-            spells=json.loads(row[14]), background=row[15], alignment=row[16],
-            notes=row[17], created_at=row[18], updated_at=row[19]
+            char_id, name, player_name, character_class, level, hp_current, hp_max, ac,
+            loads(stats), loads(modifiers), proficiency_bonus, loads(saving_throws),
+            loads(skills), loads(equipment), loads(spells), background, alignment, notes,
+            created_at, updated_at
         )
     
     def _row_to_encounter(self, row) -> Encounter:
         """Convert database row to Encounter object"""
+        # Unpacked in _ENCOUNTER_COLUMNS order
+        (encounter_id, name, description, active, round_number, current_turn,
+         participants, initiative_order, created_at, updated_at) = row
         return Encounter(
-            id=row[0], name=row[1], description=row[2], active=bool(row[3]),
-            round_number=row[4], current_turn=row[5],
-            participants=json.loads(row[6]), initiative_order=json.loads(row[7]),
-            created_at=row[8], updated_at=row[9]
+            encounter_id, name, description, bool(active), round_number, current_turn,
+            _load_json(participants), _load_json(initiative_order), created_at, updated_at
         )
 
-
 if __name__ == "__main__":
     # Example usage
     db = DatabaseManager("test_talekeeper.db")
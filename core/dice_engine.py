@@ -3,12 +3,14 @@ Deterministic dice rolling engine for D&D 5e mechanics.
 Handles all dice-based calculations with pure logic.
 """
 
-import random
+import functools
 import re
-from typing import List, Tuple, Dict, Optional
+from typing import List, Sequence, Tuple, Dict, Optional
 from dataclasses import dataclass
 from enum import Enum
 
+import numpy as np
+
 
 class AdvantageType(Enum):
     NORMAL = "normal"
@@ -16,7 +18,17 @@ class AdvantageType(Enum):
     DISADVANTAGE = "disadvantage"
 
 
-@dataclass
+_ADV_MAP = {e.value: e for e in AdvantageType}
+
+
+def parse_advantage(value: str) -> AdvantageType:
+    """Map "normal"/"advantage"/"disadvantage" (any case) to AdvantageType"""
+    adv_type = _ADV_MAP.get(value)
+    # Only non-lowercase or invalid input pays for lower() and the enum lookup (which raises)
+    return adv_type if adv_type is not None else AdvantageType(value.lower())
+
+
+@dataclass(slots=True)
 class DiceResult:
     """Result of a dice roll with detailed breakdown"""
     total: int
@@ -28,7 +40,7 @@ class DiceResult:
     description: str = ""
 
 
-@dataclass
+@dataclass(slots=True)
 class AttackResult:
     """Result of an attack roll"""
     hit: bool
@@ -38,21 +50,71 @@ class AttackResult:
     target_ac: int = 0
 
 
+# Uniform draws fetched from the generator per refill. Individual dice are served
+# from this block so the per-call cost is a list index, not a NumPy dispatch.
+_UNIFORM_BLOCK_SIZE = 4096
+
+# Which of the two d20s counts, per advantage type
+_D20_PICK = {
+    AdvantageType.NORMAL: lambda first, second: first,
+    AdvantageType.ADVANTAGE: max,
+    AdvantageType.DISADVANTAGE: min,
+}
+
+# Pattern: optional count, 'd', sides, optional modifier
+_DICE_RE = re.compile(r'(\d*)d(\d+)([+-]\d+)?')
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_dice_string(dice_string: str) -> Tuple[int, int, int]:
+    """Parse dice notation into (count, sides, modifier); cached per notation"""
+    # Clean the string
+    dice_string = dice_string.strip().lower().replace(" ", "")
+    
+    match = _DICE_RE.fullmatch(dice_string)
+    
+    if not match:
+        raise ValueError(f"Invalid dice notation: {dice_string}")
+    
+    count_str, sides_str, modifier_str = match.groups()
+    
+    count = int(count_str) if count_str else 1
+    sides = int(sides_str)
+    modifier = int(modifier_str) if modifier_str else 0
+    
+    return count, sides, modifier
+
+
 class DiceEngine:
     """Core dice rolling engine for D&D 5e mechanics"""
     
     def __init__(self, seed: Optional[int] = None):
         """Initialize with optional seed for reproducible results"""
-        if seed is not None:
-            random.seed(seed)
+        self._rng = np.random.default_rng(seed)
+        self._uniform_block: List[float] = []
+        self._uniform_pos = 0
+    
+    def _uniforms(self, count: int) -> List[float]:
+        """Take count uniform [0, 1) floats from the pre-drawn block"""
+        pos = self._uniform_pos
+        end = pos + count
+        if end > len(self._uniform_block):
+            self._uniform_block = self._rng.random(max(count, _UNIFORM_BLOCK_SIZE)).tolist()
+            pos, end = 0, count
+        self._uniform_pos = end
+        return self._uniform_block[pos:end]
     
     def roll_die(self, sides: int) -> int:
         """Roll a single die with given number of sides"""
-        return random.randint(1, sides)
+        if sides < 1:
+            raise ValueError(f"A die needs at least one side, got {sides}")
+        return int(self._uniforms(1)[0] * sides) + 1
     
     def roll_multiple(self, count: int, sides: int) -> List[int]:
         """Roll multiple dice of the same type"""
-        return [self.roll_die(sides) for _ in range(count)]
+        if sides < 1:
+            raise ValueError(f"A die needs at least one side, got {sides}")
+        return [int(u * sides) + 1 for u in self._uniforms(count)]
     
     def roll_d20(self, modifier: int = 0, advantage: AdvantageType = AdvantageType.NORMAL) -> DiceResult:
         """
@@ -65,18 +127,10 @@ class DiceEngine:
         Returns:
             DiceResult with detailed breakdown
         """
-        if advantage == AdvantageType.NORMAL:
-            rolls = [self.roll_die(20)]
-        else:
-            # Roll twice for advantage/disadvantage
-            roll1 = self.roll_die(20)
-            roll2 = self.roll_die(20)
-            rolls = [roll1, roll2]
-            
-            if advantage == AdvantageType.ADVANTAGE:
-                rolls = [max(roll1, roll2)]
-            else:  # DISADVANTAGE
-                rolls = [min(roll1, roll2)]
+        # Always roll twice in one draw; the pick table replaces the advantage branches
+        u1, u2 = self._uniforms(2)
+        roll1, roll2 = int(u1 * 20) + 1, int(u2 * 20) + 1
+        rolls = [_D20_PICK[advantage](roll1, roll2)]
         
         total = rolls[0] + modifier
         critical = rolls[0] == 20
@@ -91,6 +145,28 @@ class DiceEngine:
             description=self._format_d20_description(rolls, modifier, advantage, critical)
         )
     
+    def roll_d20_batch(self, modifier: int = 0, n: int = 1,
+                       advantage: AdvantageType = AdvantageType.NORMAL) -> np.ndarray:
+        """
+        Roll n independent d20 checks in one draw
+        
+        Args:
+            modifier: Bonus or penalty to add to every roll
+            n: Number of independent rolls
+            advantage: Normal, advantage, or disadvantage
+            
+        Returns:
+            Array of n totals
+        """
+        rolls = self._rng.integers(1, 21, size=(n, 2))
+        if advantage == AdvantageType.ADVANTAGE:
+            picked = rolls.max(axis=1)
+        elif advantage == AdvantageType.DISADVANTAGE:
+            picked = rolls.min(axis=1)
+        else:
+            picked = rolls[:, 0]
+        return picked + modifier
+    
     def parse_dice_string(self, dice_string: str) -> Tuple[int, int, int]:
         """
         Parse dice notation like '2d6+3' or '1d8-1'
@@ -98,23 +174,7 @@ class DiceEngine:
         Returns:
             Tuple of (count, sides, modifier)
         """
-        # Clean the string
-        dice_string = dice_string.strip().lower().replace(" ", "")
-        
-        # Pattern: optional count, 'd', sides, optional modifier
-        pattern = r'^(\d*)d(\d+)([+-]\d+)?$'
-        match = re.match(pattern, dice_string)
-        
-        if not match:
-            raise ValueError(f"Invalid dice notation: {dice_string}")
-        
-        count_str, sides_str, modifier_str = match.groups()
-        
-        count = int(count_str) if count_str else 1
-        sides = int(sides_str)
-        modifier = int(modifier_str) if modifier_str else 0
-        
-        return count, sides, modifier
+        return _parse_dice_string(dice_string)
     
     def roll_damage(self, dice_string: str, bonus_modifier: int = 0) -> DiceResult:
         """
@@ -141,6 +201,26 @@ class DiceEngine:
             description=self._format_damage_description(rolls, total_modifier, dice_string)
         )
     
+    def roll_damage_batch(self, dice_string: str, n: int, bonus_modifier: int = 0,
+                          critical: bool = False) -> np.ndarray:
+        """
+        Roll the same damage n times in one draw
+        
+        Args:
+            dice_string: Dice notation (e.g., '2d6+3')
+            n: Number of independent rolls
+            bonus_modifier: Additional modifier beyond what's in the string
+            critical: Double the dice, not the modifier
+            
+        Returns:
+            Array of n damage totals
+        """
+        count, sides, string_modifier = self.parse_dice_string(dice_string)
+        if critical:
+            count *= 2
+        rolls = self._rng.integers(1, sides + 1, size=(n, count))
+        return rolls.sum(axis=1) + (string_modifier + bonus_modifier)
+    
     def calculate_attack(self, attack_bonus: int, target_ac: int, 
                         advantage: AdvantageType = AdvantageType.NORMAL) -> AttackResult:
         """
@@ -155,18 +235,11 @@ class DiceEngine:
             AttackResult with hit/miss and roll details
         """
         attack_roll = self.roll_d20(attack_bonus, advantage)
+        natural = attack_roll.rolls[0]
         
-        # Natural 20 always hits and is critical
-        if attack_roll.rolls[0] == 20:
-            hit = True
-            critical_hit = True
-        # Natural 1 always misses
-        elif attack_roll.rolls[0] == 1:
-            hit = False
-            critical_hit = False
-        else:
-            hit = attack_roll.total >= target_ac
-            critical_hit = False
+        # Natural 20 always hits and is critical, natural 1 always misses
+        critical_hit = natural == 20
+        hit = (natural != 1) & (critical_hit | (attack_roll.total >= target_ac))
         
         return AttackResult(
             hit=hit,
@@ -222,10 +295,38 @@ class DiceEngine:
         
         return success, roll
     
+    def save_success_probability_table(self, bonuses: Sequence[int], dcs: Sequence[int],
+                                       advantage: AdvantageType = AdvantageType.NORMAL) -> np.ndarray:
+        """
+        Exact chance of each saving throw bonus meeting each DC, without rolling
+        
+        Args:
+            bonuses: Saving throw bonuses (rows)
+            dcs: Difficulty Classes (columns)
+            advantage: Advantage type for the rolls
+            
+        Returns:
+            Array of shape (len(bonuses), len(dcs)) of success probabilities
+        """
+        bonus_col = np.asarray(bonuses, dtype=np.int64)[:, None]
+        dc_row = np.asarray(dcs, dtype=np.int64)[None, :]
+        p = np.clip((21 + bonus_col - dc_row) / 20, 0.0, 1.0)
+        if advantage == AdvantageType.ADVANTAGE:
+            return 1 - (1 - p) ** 2
+        if advantage == AdvantageType.DISADVANTAGE:
+            return p ** 2
+        return p
+    
     def roll_initiative(self, dex_modifier: int) -> DiceResult:
         """Roll initiative (d20 + Dex modifier)"""
         return self.roll_d20(dex_modifier)
     
+    def roll_initiative_batch(self, dex_modifiers: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """Roll initiative for many combatants in one draw; returns (natural d20s, totals)"""
+        modifiers = np.asarray(dex_modifiers, dtype=np.int64)
+        rolls = self._rng.integers(1, 21, size=modifiers.shape[0])
+        return rolls, rolls + modifiers
+    
     def roll_ability_scores(self, method: str = "4d6_drop_lowest") -> List[int]:
         """
         Roll ability scores using various methods
@@ -237,16 +338,13 @@ class DiceEngine:
             List of 6 ability scores
         """
         if method == "4d6_drop_lowest":
-            scores = []
-            for _ in range(6):
-                rolls = self.roll_multiple(4, 6)
-                # Drop the lowest
-                rolls.sort(reverse=True)
-                scores.append(sum(rolls[:3]))
-            return scores
+            # All 24 dice in one draw; sort each row and drop the lowest column
+            rolls = self._rng.integers(1, 7, size=(6, 4))
+            rolls.sort(axis=1)
+            return rolls[:, 1:].sum(axis=1).tolist()
         
         elif method == "3d6":
-            return [sum(self.roll_multiple(3, 6)) for _ in range(6)]
+            return self._rng.integers(1, 7, size=(6, 3)).sum(axis=1).tolist()
         
         else:
             raise ValueError(f"Unknown ability score method: {method}")
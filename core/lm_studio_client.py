@@ -3,39 +3,419 @@ LM Studio HTTP Client for narrative generation.
 Connects to local LM Studio server for D&D story and combat descriptions.
 """
 
+import asyncio
+import atexit
+import functools
+import httpx
+# httpx imports its transport stack (httpcore, anyio, h11) on the first AsyncClient, which
+# would stall that event loop for ~70 ms; load it with the module instead
+import httpcore  # noqa: F401
+import os
 import requests
-import json
-from typing import Dict, List, Optional, Any
+import orjson
+import re
+import threading
+import time
+import weakref
+import zlib
+from collections import OrderedDict
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
 import logging
 
+import numpy as np
+
 logger = logging.getLogger(__name__)
 
+# Clients not yet closed; weak so the exit hook never keeps a client alive
+_open_clients: "weakref.WeakSet[LMStudioClient]" = weakref.WeakSet()
+
+
+@atexit.register
+def _close_open_clients():
+    """Close the async connections of every client still open at interpreter exit"""
+    for client in list(_open_clients):
+        client._close_async_client()
+
+# Short narrations stop streaming at the first sentence end past this many characters
+NARRATION_STOP_CHARS = 120
+_SENTENCE_ENDS = (".", "!", "?")
+
+# Streamed chunks arriving within this window are forwarded to the client as one message
+STREAM_COALESCE_SECONDS = 0.020
+
+# Unix socket in front of a local LM Studio (e.g. an nginx proxy); skips the loopback TCP stack
+LMSTUDIO_UDS = os.environ.get("LMSTUDIO_UDS")
+
+# While the server is marked down, generations fall back at once and it is re-probed this often
+PROBE_RETRY_SECONDS = 30.0
+
+# Connection pool sized for concurrent MCP tool calls sharing one client
+HTTP_POOL_SIZE = 32
+# Failed connects are retried for every method, POSTs included, since nothing was sent yet;
+# gateway errors and read failures only for idempotent methods, so completions are never re-sent
+HTTP_RETRY = Retry(total=2, backoff_factor=0.1, status_forcelist=[502, 503, 504])
+ASYNC_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=32, max_connections=64)
+
+# Completed narrations kept for identical prompts; temperatures share a bucket per 0.1
+NARRATION_CACHE_SIZE = 1024
+
+# Async narrations arriving within this window are sent to LM Studio together;
+# a batch also flushes as soon as this many are waiting
+BATCH_WINDOW_MS = 10.0
+BATCH_MIN_SIZE = 8
+
+# Near-duplicate prompts reuse a cached narration above this cosine similarity
+SEMANTIC_CACHE_THRESHOLD = 0.92
+SEMANTIC_CACHE_SIZE = 10000
+_EMBED_DIM = 512
+_ENTITY_SLOT = "\x00"
+_NUMBER_RE = re.compile(r"\d+")
+
+
+def _mask_entity(text: str, entity: str) -> str:
+    """Replace whole-word occurrences of entity with _ENTITY_SLOT (so "Bat" leaves "Battle" alone)"""
+    return re.sub(rf"(?<!\w){re.escape(entity)}(?!\w)", _ENTITY_SLOT, text)
+
+
+# Prompt templates, single-line so LM Studio doesn't tokenize source indentation
+COMBAT_MISS_TMPL = "Describe {attacker}'s attack that missed (rolled {attack_roll} vs AC {target_ac}). Make it dramatic but clearly a miss. Keep it to 1-2 sentences."
+COMBAT_CRIT_TMPL = "Describe {attacker}'s critical hit attack that dealt {damage} damage! This was a spectacular, devastating blow. Keep it to 1-2 sentences."
+COMBAT_HIT_TMPL = "Describe {attacker}'s successful attack that dealt {damage} damage (rolled {attack_roll} vs AC {target_ac}). Keep it to 1-2 sentences."
+DAMAGE_UNCONSCIOUS_TMPL = "Describe {character} taking {damage} {damage_type} damage and falling unconscious (from {old_hp} to {new_hp} HP). Make it dramatic but not graphic. 1-2 sentences."
+DAMAGE_SEVERE_TMPL = "Describe {character} taking {damage} {damage_type} damage and being severely wounded (from {old_hp} to {new_hp} HP). Show they're badly hurt. 1-2 sentences."
+DAMAGE_TMPL = "Describe {character} taking {damage} {damage_type} damage (from {old_hp} to {new_hp} HP). 1-2 sentences."
+HEAL_FULL_TMPL = "Describe {character} being fully healed by {heal_type} healing (from {old_hp} to {new_hp} HP). They're completely restored. 1-2 sentences."
+HEAL_MAJOR_TMPL = "Describe {character} receiving {healing} points of {heal_type} healing, making a major recovery (from {old_hp} to {new_hp} HP). 1-2 sentences."
+HEAL_TMPL = "Describe {character} receiving {healing} points of {heal_type} healing (from {old_hp} to {new_hp} HP). 1-2 sentences."
+# Fixed instructions lead so every NPC/narrator call shares a longer prefix in LM Studio's KV cache
+NPC_DIALOGUE_TMPL = "Speak in character with appropriate tone and mannerisms. Keep it to 1-3 sentences and include dialogue in quotes. You are {npc_name}, a {personality} NPC. Respond to this situation: {situation}"
+ENVIRONMENT_TMPL = "Describe a {mood} {location_type} that the party encounters. {features_text}Make it atmospheric and immersive. Keep it to 2-3 sentences, focusing on what the characters see, hear, and smell."
+QUEST_HOOK_TMPL = "Create a {difficulty} difficulty {quest_type} quest hook for a D&D party. Include the problem, potential rewards, and what makes it urgent or interesting. Keep it to 2-3 sentences."
+
+_SYSTEM_PROMPT = "You are a skilled Dungeon Master narrating a D&D game. Be descriptive but concise."
+_SYSTEM_MESSAGE = {"role": "system", "content": _SYSTEM_PROMPT}
+_STREAM_DONE = object()
+
+
+def hashed_ngram_embedding(text: str) -> np.ndarray:
+    """Embed text as hashed character trigram counts (dependency-free stand-in for a sentence model)"""
+    text = " ".join(text.lower().split())
+    vector = np.zeros(_EMBED_DIM, dtype=np.float32)
+    for i in range(len(text) - 2):
+        vector[zlib.crc32(text[i:i + 3].encode()) % _EMBED_DIM] += 1.0
+    return vector
+
+
+async def coalesce_chunks(chunks: AsyncIterator[str],
+                          interval: float = STREAM_COALESCE_SECONDS) -> AsyncIterator[str]:
+    """
+    Merge streamed text chunks so at most one is yielded per interval
+    
+    The first chunk passes straight through to keep time-to-first-token; later
+    ones are held until interval has passed since the last yield, and are flushed
+    then even if the source has stalled. Whatever is held when the stream ends is
+    flushed with it.
+    """
+    loop = asyncio.get_running_loop()
+    source = aiter(chunks)
+    held = []
+    last = None
+    # The next read stays pending across flushes; cancelling it could break the source
+    pending: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(anext(source))
+            timeout = max(0.0, last + interval - loop.time()) if held else None
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if not done:
+                yield "".join(held)
+                held.clear()
+                last = loop.time()
+                continue
+            
+            next_chunk, pending = pending, None
+            try:
+                chunk = next_chunk.result()
+            except StopAsyncIteration:
+                break
+            held.append(chunk)
+            now = loop.time()
+            if last is None or now - last >= interval:
+                yield "".join(held)
+                held.clear()
+                last = now
+        if held:
+            yield "".join(held)
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+def _prune_closed_loops(per_loop: Dict[asyncio.AbstractEventLoop, Any]):
+    """Drop per-event-loop state whose loop has been closed"""
+    for loop in [loop for loop in per_loop if loop.is_closed()]:
+        del per_loop[loop]
+
+
+class SemanticCache:
+    """
+    Cache of narrations looked up by prompt similarity rather than exact match
+    
+    Prompts are embedded with the entity name masked out, so "Thorin missed" and
+    "Elara missed" share an entry; the cached narration is rewritten with the new
+    name. A hit is refused if the narration quotes a number the new prompt lacks.
+    Entries live in a namespace per narration kind and canonical bucket (e.g.
+    "damage:fire:severe"), so details that barely change the prompt's wording
+    never cross over, and are evicted least recently used first.
+    """
+    
+    def __init__(self, embed: Callable[[str], np.ndarray] = hashed_ngram_embedding,
+                 threshold: float = SEMANTIC_CACHE_THRESHOLD, capacity: int = SEMANTIC_CACHE_SIZE):
+        """
+        Args:
+            embed: Text to vector function, e.g. SentenceTransformer("all-MiniLM-L6-v2").encode
+            threshold: Minimum cosine similarity for a hit
+            capacity: Maximum number of cached narrations
+        """
+        self.embed = embed
+        self.threshold = threshold
+        self.capacity = capacity
+        # Rows grow by doubling up to capacity, so a small cache stays small
+        self._matrix: Optional[np.ndarray] = None
+        self._last_used = np.zeros(0, dtype=np.int64)
+        self._responses: List[str] = []
+        self._namespaces: List[str] = []
+        self._clock = 0
+        self._lock = threading.Lock()
+    
+    def _embed(self, prompt: str, entity: str) -> np.ndarray:
+        vector = np.asarray(self.embed(_mask_entity(prompt, entity)), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    def get(self, prompt: str, entity: str, namespace: str = "") -> Optional[str]:
+        """Return a cached narration for a similar prompt in namespace, rewritten for entity"""
+        if not self._responses:
+            return None
+        query = self._embed(prompt, entity)
+        numbers = set(_NUMBER_RE.findall(prompt))
+        with self._lock:
+            similarities = self._matrix[:len(self._responses)] @ query
+            candidates = np.flatnonzero(similarities > self.threshold)
+            for i in candidates[np.argsort(-similarities[candidates])]:
+                template = self._responses[i]
+                if self._namespaces[i] == namespace and numbers.issuperset(_NUMBER_RE.findall(template)):
+                    self._clock += 1
+                    self._last_used[i] = self._clock
+                    return template.replace(_ENTITY_SLOT, entity)
+        return None
+    
+    def put(self, prompt: str, entity: str, response: str, namespace: str = ""):
+        """Cache a narration, remembering where the entity's name appears"""
+        vector = self._embed(prompt, entity)
+        with self._lock:
+            size = len(self._responses)
+            if size < self.capacity:
+                if self._matrix is None or size == self._matrix.shape[0]:
+                    rows = min(max(64, size * 2), self.capacity)
+                    matrix = np.zeros((rows, vector.shape[0]), dtype=np.float32)
+                    if self._matrix is not None:
+                        matrix[:size] = self._matrix
+                    self._matrix = matrix
+                    self._last_used = np.resize(self._last_used, rows)
+                self._responses.append("")
+                self._namespaces.append("")
+                slot = size
+            else:
+                slot = int(np.argmin(self._last_used))
+            self._clock += 1
+            self._matrix[slot] = vector
+            self._last_used[slot] = self._clock
+            self._responses[slot] = _mask_entity(response, entity)
+            self._namespaces[slot] = namespace
+
+
+class NarrativeDispatcher:
+    """
+    Pools async narration requests from concurrent coroutines into batches
+    
+    Requests wait on a queue until batch_min_size are pending or the batch window
+    (or a tighter per-request latency budget) runs out, then go to LM Studio
+    together on the client's keep-alive pool. Each caller awaits its own future.
+    LM Studio has no batch completions endpoint, so a batch is a gather of POSTs.
+    """
+    
+    def __init__(self, client: "LMStudioClient", batch_min_size: int = BATCH_MIN_SIZE,
+                 batch_window_ms: float = BATCH_WINDOW_MS):
+        """
+        Args:
+            client: Client whose streaming generation serves each request
+            batch_min_size: Flush as soon as this many requests are waiting
+            batch_window_ms: Longest a request waits for others to join its batch
+        """
+        self.client = client
+        self.batch_min_size = batch_min_size
+        self.batch_window_ms = batch_window_ms
+        # One queue and flusher per event loop that submits
+        self._queues: Dict[asyncio.AbstractEventLoop, asyncio.Queue] = {}
+        self._tasks = set()
+    
+    async def submit(self, prompt: str, max_tokens: int = 150, temperature: float = 0.7,
+                     stop_after_chars: Optional[int] = None, entity: Optional[str] = None,
+                     namespace: str = "", latency_budget_ms: Optional[float] = None) -> str:
+        """
+        Queue a generation and wait for its text
+        
+        Args:
+            latency_budget_ms: Longest this request may wait for a batch to fill
+                (default and maximum: batch_window_ms)
+        """
+        loop = asyncio.get_running_loop()
+        queue = self._queues.get(loop)
+        if queue is None:
+            _prune_closed_loops(self._queues)
+            queue = self._queues[loop] = asyncio.Queue()
+            self._spawn(self._flush_loop(queue))
+        
+        wait_ms = self.batch_window_ms
+        if latency_budget_ms is not None:
+            wait_ms = min(wait_ms, latency_budget_ms)
+        
+        future = loop.create_future()
+        args = (prompt, max_tokens, temperature, stop_after_chars, entity, namespace)
+        queue.put_nowait((args, future, loop.time() + wait_ms / 1000))
+        return await future
+    
+    def _spawn(self, coro):
+        """Run a background task, keeping a reference until it finishes"""
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def _flush_loop(self, queue: asyncio.Queue):
+        """Collect requests until a batch is full or its earliest deadline passes, then send it"""
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await queue.get()
+            batch = [item]
+            deadline = item[2]
+            while len(batch) < self.batch_min_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                deadline = min(deadline, item[2])
+            # Don't hold the queue while LM Studio works; the next window opens immediately
+            self._spawn(self._run_batch(batch))
+    
+    async def _run_batch(self, batch: List[Tuple[Tuple, asyncio.Future, float]]):
+        """Issue a batch of generations concurrently and resolve each caller's future"""
+        async def generate(args: Tuple, future: asyncio.Future):
+            try:
+                text = "".join([chunk async for chunk in self.client._agenerate_text(*args)]).strip()
+            except asyncio.CancelledError:
+                return  # The caller gave up; nobody is waiting for this text
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                return
+            if not future.done():
+                future.set_result(text)
+        
+        def abort_if_cancelled(future: asyncio.Future, task: asyncio.Task):
+            if future.cancelled():
+                task.cancel()
+        
+        tasks = []
+        for args, future, _ in batch:
+            if future.done():
+                continue
+            task = asyncio.ensure_future(generate(args, future))
+            # A caller cancelling its request aborts the POST rather than letting it run on
+            future.add_done_callback(functools.partial(abort_if_cancelled, task=task))
+            tasks.append(task)
+        await asyncio.gather(*tasks)
+
 
 class LMStudioClient:
     """Client for connecting to LM Studio HTTP API"""
     
-    def __init__(self, base_url: str = "http://localhost:1234", model: str = None):
+    def __init__(self, base_url: str = "http://localhost:1234", model: str = None,
+                 semantic_cache: Optional[SemanticCache] = None, uds: Optional[str] = LMSTUDIO_UDS):
         """
         Initialize LM Studio client
         
         Args:
             base_url: LM Studio server URL (default: http://localhost:1234)
             model: Specific model to use (if None, uses loaded model)
+            semantic_cache: Cache for near-duplicate narrations (default: hashed n-gram embeddings)
+            uds: Unix socket path for async requests to a local server (default: $LMSTUDIO_UDS)
         """
         self.base_url = base_url.rstrip('/')
         self.model = model
         self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE,
+                              max_retries=HTTP_RETRY)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Connection": "keep-alive", "Content-Type": "application/json"})
         
-        # Test connection
-        self._test_connection()
+        # Async clients for callers running on an event loop, one per loop (see _async_client)
+        self._uds = uds if uds and httpx.URL(self.base_url).host in ("localhost", "127.0.0.1") else None
+        self._aclients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+        # Loading CA certificates takes tens of ms, too long to repeat on an event loop per client
+        self._ssl_context = httpx.create_ssl_context()
+        _open_clients.add(self)
+        
+        self._cache: "OrderedDict[Tuple, str]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.semantic_cache = semantic_cache or SemanticCache()
+        
+        # Async narrations are pooled into batches
+        self.dispatcher = NarrativeDispatcher(self)
+        
+        # Probe the server in the background so construction (and server startup) never blocks
+        self._connection_ok: Optional[bool] = None
+        self._probe_started = 0.0
+        self._probe_connection()
+    
+    def _probe_connection(self):
+        """Run _test_connection on a daemon thread"""
+        self._probe_started = time.monotonic()
+        threading.Thread(target=self._test_connection, daemon=True).start()
+    
+    def _server_down(self) -> bool:
+        """True if the last probe failed; starts a new background probe every PROBE_RETRY_SECONDS"""
+        if self._connection_ok is not False:
+            return False
+        if time.monotonic() - self._probe_started >= PROBE_RETRY_SECONDS:
+            self._probe_connection()
+        return True
     
     def _test_connection(self) -> bool:
-        """Test if LM Studio server is available"""
+        """Test if LM Studio server is available, recording the result for _server_down"""
+        self._connection_ok = self._check_connection()
+        return self._connection_ok
+    
+    def _check_connection(self) -> bool:
+        """Probe the LM Studio server"""
         try:
-            response = self.session.get(f"{self.base_url}/v1/models", timeout=5)
+            # HEAD avoids downloading and parsing the model list just to check reachability
+            url = f"{self.base_url}/v1/models"
+            response = self.session.head(url, timeout=2)
+            if response.status_code in (405, 501):
+                # Server doesn't do HEAD; open a GET but close it without reading the body
+                with self.session.get(url, timeout=2, stream=True) as response:
+                    pass
             if response.status_code == 200:
-                models = response.json()
-                logger.info(f"Connected to LM Studio. Available models: {len(models.get('data', []))}")
+                logger.info(f"Connected to LM Studio at {self.base_url}")
                 return True
             else:
                 logger.warning(f"LM Studio responded with status {response.status_code}")
@@ -44,49 +424,264 @@ class LMStudioClient:
             logger.warning(f"Could not connect to LM Studio at {self.base_url}: {e}")
             return False
     
-    def _generate_text(self, prompt: str, max_tokens: int = 150, temperature: float = 0.7) -> str:
+    def _async_client(self) -> httpx.AsyncClient:
+        """The httpx.AsyncClient for the running event loop (connections can't cross loops)"""
+        loop = asyncio.get_running_loop()
+        aclient = self._aclients.get(loop)
+        if aclient is None or aclient.is_closed:
+            # Clients of finished loops can't be closed any more (see arelease); let them go
+            _prune_closed_loops(self._aclients)
+            transport = httpx.AsyncHTTPTransport(uds=self._uds, limits=ASYNC_HTTP_LIMITS,
+                                                 verify=self._ssl_context) if self._uds else None
+            aclient = httpx.AsyncClient(base_url=self.base_url, timeout=30.0, limits=ASYNC_HTTP_LIMITS,
+                                        headers={"Content-Type": "application/json"}, transport=transport,
+                                        verify=self._ssl_context)
+            self._aclients[loop] = aclient
+        return aclient
+    
+    def close(self):
+        """Close the pooled HTTP connections (use aclose on a running event loop)"""
+        _open_clients.discard(self)
+        self.session.close()
+        self._close_async_client()
+    
+    async def aclose(self):
+        """Close the pooled HTTP connections from a running event loop"""
+        _open_clients.discard(self)
+        self.session.close()
+        self._close_foreign_async_clients()
+        await self.arelease()
+    
+    async def arelease(self):
         """
-        Generate text using LM Studio API
+        Close the running event loop's async connections, keeping the client usable
+        
+        Call before a short-lived loop (e.g. asyncio.run) finishes; the next async
+        call opens a fresh pool on whichever loop it runs on.
+        """
+        aclient = self._aclients.pop(asyncio.get_running_loop(), None)
+        if aclient is not None:
+            await aclient.aclose()
+    
+    def _close_foreign_async_clients(self):
+        """Close async clients of other event loops that are still running; drop the rest"""
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        for loop, aclient in list(self._aclients.items()):
+            if loop is current:
+                continue
+            del self._aclients[loop]
+            if loop.is_running() and not aclient.is_closed:
+                asyncio.run_coroutine_threadsafe(aclient.aclose(), loop)
+    
+    def _close_async_client(self):
+        """Close the async clients from sync code; also run at interpreter exit"""
+        self._close_foreign_async_clients()
+    
+    @staticmethod
+    def _cache_key(prompt: str, max_tokens: int, temperature: float,
+                   stop_after_chars: Optional[int]) -> Tuple:
+        """Key for the narration cache"""
+        return (prompt, max_tokens, round(temperature * 10), stop_after_chars)
+    
+    def _cache_get(self, key: Tuple, entity: Optional[str], namespace: str = "") -> Optional[str]:
+        """Look up a cached narration, exact match first, then a similar prompt about entity"""
+        with self._cache_lock:
+            text = self._cache.get(key)
+            if text is not None:
+                self._cache.move_to_end(key)
+                return text
+        if entity:
+            return self.semantic_cache.get(key[0], entity, namespace)
+        return None
+    
+    def _cache_put(self, key: Tuple, entity: Optional[str], namespace: str, parts: List[str]):
+        """Cache a completed narration, evicting the least recently used"""
+        if not parts:
+            return
+        text = "".join(parts)
+        with self._cache_lock:
+            self._cache[key] = text
+            self._cache.move_to_end(key)
+            if len(self._cache) > NARRATION_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        if entity:
+            self.semantic_cache.put(key[0], entity, text, namespace)
+    
+    def _build_body(self, prompt: str, max_tokens: int, temperature: float) -> bytes:
+        """Encode a streaming chat completion request"""
+        payload = {
+            "messages": [
+                _SYSTEM_MESSAGE,
+                {"role": "user", "content": prompt}
+            ],
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "stream": True,
+            # Reuse the server's KV cache for the shared system-prompt prefix, and seed
+            # sampling from the prompt so identical prompts give identical (cacheable) text
+            "cache_prompt": True,
+            "seed": zlib.crc32(prompt.encode())
+        }
+        # Without a model LM Studio uses whichever is loaded; don't send "model": null
+        if self.model:
+            payload["model"] = self.model
+        return orjson.dumps(payload)
+    
+    @staticmethod
+    def _parse_stream_line(line: str):
+        """Return the text chunk in an SSE line, None if it carries none, or _STREAM_DONE"""
+        # Server-sent events: one "data: {json}" line per delta, "data: [DONE]" at the end
+        if not line.startswith("data: "):
+            return None
+        data = line[6:]
+        if data == "[DONE]":
+            return _STREAM_DONE
+        return orjson.loads(data)["choices"][0]["delta"].get("content")
+    
+    def _generate_text(self, prompt: str, max_tokens: int = 150, temperature: float = 0.7,
+                       stop_after_chars: Optional[int] = None, entity: Optional[str] = None,
+                       namespace: str = "") -> Iterator[str]:
+        """
+        Stream generated text from the LM Studio API
         
         Args:
             prompt: Input prompt
             max_tokens: Maximum tokens to generate
             temperature: Creativity level (0.0 = deterministic, 1.0 = very creative)
+            stop_after_chars: If set, stop at the first sentence end once this many
+                characters have been produced
+            entity: Name the prompt is about; enables the semantic cache
+            namespace: Narration kind, so semantic hits never cross kinds
             
-        Returns:
-            Generated text or fallback message
+        Yields:
+            Text chunks as they arrive, or a single fallback message on failure.
+            A cached narration for the same prompt is yielded whole.
         """
+        key = self._cache_key(prompt, max_tokens, temperature, stop_after_chars)
+        cached = self._cache_get(key, entity, namespace)
+        if cached is not None:
+            yield cached
+            return
+        
+        if self._server_down():
+            yield self._fallback_response(prompt)
+            return
+        
+        parts = []
+        produced = 0
         try:
-            payload = {
-                "model": self.model,
-                "messages": [
-                    {"role": "system", "content": "You are a skilled Dungeon Master narrating a D&D game. Be descriptive but concise."},
-                    {"role": "user", "content": prompt}
-                ],
-                "max_tokens": max_tokens,
-                "temperature": temperature,
-                "stream": False
-            }
+            body = self._build_body(prompt, max_tokens, temperature)
             
-            response = self.session.post(
+            with self.session.post(
                 f"{self.base_url}/v1/chat/completions",
-                json=payload,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                return result["choices"][0]["message"]["content"].strip()
-            else:
-                logger.error(f"LM Studio API error: {response.status_code} - {response.text}")
-                return self._fallback_response(prompt)
+                data=body,
+                timeout=30,
+                stream=True
+            ) as response:
+                if response.status_code != 200:
+                    logger.error(f"LM Studio API error: {response.status_code} - {response.text}")
+                    yield self._fallback_response(prompt)
+                    return
+                
+                response.encoding = "utf-8"
+                for line in response.iter_lines(decode_unicode=True):
+                    chunk = self._parse_stream_line(line)
+                    if chunk is _STREAM_DONE:
+                        break
+                    if not chunk:
+                        continue
+                    
+                    parts.append(chunk)
+                    produced += len(chunk)
+                    yield chunk
+                    
+                    if (stop_after_chars and produced >= stop_after_chars
+                            and chunk.rstrip().endswith(_SENTENCE_ENDS)):
+                        break
+                
+                # Only complete generations are cached, never fallbacks or cut-off streams
+                self._cache_put(key, entity, namespace, parts)
                 
         except requests.exceptions.RequestException as e:
             logger.error(f"Request to LM Studio failed: {e}")
-            return self._fallback_response(prompt)
-        except (KeyError, IndexError, json.JSONDecodeError) as e:
+            if not produced:
+                yield self._fallback_response(prompt)
+        except (KeyError, IndexError, orjson.JSONDecodeError) as e:
             logger.error(f"Error parsing LM Studio response: {e}")
-            return self._fallback_response(prompt)
+            if not produced:
+                yield self._fallback_response(prompt)
+    
+    def _generate_text_sync(self, prompt: str, max_tokens: int = 150, temperature: float = 0.7,
+                            stop_after_chars: Optional[int] = None) -> str:
+        """Generate text and return it once complete (see _generate_text)"""
+        return "".join(self._generate_text(prompt, max_tokens, temperature, stop_after_chars)).strip()
+    
+    async def _agenerate_text(self, prompt: str, max_tokens: int = 150, temperature: float = 0.7,
+                              stop_after_chars: Optional[int] = None, entity: Optional[str] = None,
+                              namespace: str = "") -> AsyncIterator[str]:
+        """Async version of _generate_text, streaming over the shared httpx.AsyncClient"""
+        key = self._cache_key(prompt, max_tokens, temperature, stop_after_chars)
+        cached = self._cache_get(key, entity, namespace)
+        if cached is not None:
+            yield cached
+            return
+        
+        if self._server_down():
+            yield self._fallback_response(prompt)
+            return
+        
+        parts = []
+        produced = 0
+        try:
+            body = self._build_body(prompt, max_tokens, temperature)
+            
+            async with self._async_client().stream("POST", "/v1/chat/completions", content=body) as response:
+                if response.status_code != 200:
+                    body = (await response.aread()).decode(errors="replace")
+                    logger.error(f"LM Studio API error: {response.status_code} - {body}")
+                    yield self._fallback_response(prompt)
+                    return
+                
+                async for line in response.aiter_lines():
+                    chunk = self._parse_stream_line(line)
+                    if chunk is _STREAM_DONE:
+                        break
+                    if not chunk:
+                        continue
+                    
+                    parts.append(chunk)
+                    produced += len(chunk)
+                    yield chunk
+                    
+                    if (stop_after_chars and produced >= stop_after_chars
+                            and chunk.rstrip().endswith(_SENTENCE_ENDS)):
+                        break
+                
+                # Only complete generations are cached, never fallbacks or cut-off streams
+                self._cache_put(key, entity, namespace, parts)
+                
+        except httpx.HTTPError as e:
+            logger.error(f"Request to LM Studio failed: {e}")
+            if not produced:
+                yield self._fallback_response(prompt)
+        except (KeyError, IndexError, orjson.JSONDecodeError) as e:
+            logger.error(f"Error parsing LM Studio response: {e}")
+            if not produced:
+                yield self._fallback_response(prompt)
+    
+    async def agenerate_text(self, prompt: str, max_tokens: int = 150, temperature: float = 0.7,
+                             stop_after_chars: Optional[int] = None, entity: Optional[str] = None,
+                             namespace: str = "", latency_budget_ms: Optional[float] = None) -> str:
+        """Generate text through the dispatcher, returning it once complete (see _generate_text)"""
+        cached = self._cache_get(self._cache_key(prompt, max_tokens, temperature, stop_after_chars),
+                                 entity, namespace)
+        if cached is not None:
+            return cached.strip()
+        return await self.dispatcher.submit(prompt, max_tokens, temperature, stop_after_chars, entity,
+                                            namespace, latency_budget_ms)
     
     def _fallback_response(self, prompt: str) -> str:
         """Generate a fallback response when LM Studio is unavailable"""
@@ -100,8 +695,12 @@ class LMStudioClient:
             return "The action unfolds dramatically."
     
     def generate_combat_description(self, context: Dict[str, Any]) -> str:
+        """Generate a narrative description of a combat action (see stream_combat_description)"""
+        return "".join(self.stream_combat_description(context)).strip()
+    
+    def stream_combat_description(self, context: Dict[str, Any]) -> Iterator[str]:
         """
-        Generate a narrative description of a combat action
+        Stream a narrative description of a combat action
         
         Args:
             context: Dictionary with combat details
@@ -112,6 +711,31 @@ class LMStudioClient:
                 - target_ac: Target's AC
                 - damage: Damage dealt (if any)
         """
+        return self._generate_text(self._combat_prompt(context), max_tokens=100, temperature=0.8,
+                                   stop_after_chars=NARRATION_STOP_CHARS,
+                                   entity=context.get("attacker", "The attacker"), namespace=self._combat_namespace(context))
+    
+    def astream_combat_description(self, context: Dict[str, Any]) -> AsyncIterator[str]:
+        """Async version of stream_combat_description"""
+        return self._agenerate_text(self._combat_prompt(context), max_tokens=100, temperature=0.8,
+                                    stop_after_chars=NARRATION_STOP_CHARS,
+                                    entity=context.get("attacker", "The attacker"), namespace=self._combat_namespace(context))
+    
+    async def agenerate_combat_description(self, context: Dict[str, Any]) -> str:
+        """Async version of generate_combat_description"""
+        return await self.agenerate_text(self._combat_prompt(context), 100, 0.8, NARRATION_STOP_CHARS,
+                                         context.get("attacker", "The attacker"), self._combat_namespace(context))
+    
+    @staticmethod
+    def _combat_namespace(context: Dict[str, Any]) -> str:
+        """Semantic cache namespace: the combat outcome"""
+        if not context.get("hit", False):
+            return "combat:miss"
+        return "combat:critical" if context.get("critical", False) else "combat:hit"
+    
+    @staticmethod
+    def _combat_prompt(context: Dict[str, Any]) -> str:
+        """Build the combat narration prompt"""
         attacker = context.get("attacker", "The attacker")
         hit = context.get("hit", False)
         critical = context.get("critical", False)
@@ -120,26 +744,22 @@ class LMStudioClient:
         damage = context.get("damage", 0)
         
         if not hit:
-            prompt = f"""
-            Describe {attacker}'s attack that missed (rolled {attack_roll} vs AC {target_ac}). 
-            Make it dramatic but clearly a miss. Keep it to 1-2 sentences.
-            """
+            prompt = COMBAT_MISS_TMPL.format(attacker=attacker, attack_roll=attack_roll, target_ac=target_ac)
         elif critical:
-            prompt = f"""
-            Describe {attacker}'s critical hit attack that dealt {damage} damage! 
-            This was a spectacular, devastating blow. Keep it to 1-2 sentences.
-            """
+            prompt = COMBAT_CRIT_TMPL.format(attacker=attacker, damage=damage)
         else:
-            prompt = f"""
-            Describe {attacker}'s successful attack that dealt {damage} damage 
-            (rolled {attack_roll} vs AC {target_ac}). Keep it to 1-2 sentences.
-            """
+            prompt = COMBAT_HIT_TMPL.format(attacker=attacker, damage=damage,
+                                            attack_roll=attack_roll, target_ac=target_ac)
         
-        return self._generate_text(prompt, max_tokens=100, temperature=0.8)
+        return prompt
     
     def generate_damage_description(self, context: Dict[str, Any]) -> str:
+        """Generate a narrative description of taking damage (see stream_damage_description)"""
+        return "".join(self.stream_damage_description(context)).strip()
+    
+    def stream_damage_description(self, context: Dict[str, Any]) -> Iterator[str]:
         """
-        Generate a narrative description of taking damage
+        Stream a narrative description of taking damage
         
         Args:
             context: Dictionary with damage details
@@ -150,34 +770,64 @@ class LMStudioClient:
                 - new_hp: HP after damage
                 - unconscious: Whether character is now unconscious
         """
+        return self._generate_text(self._damage_prompt(context), max_tokens=100, temperature=0.7,
+                                   stop_after_chars=NARRATION_STOP_CHARS,
+                                   entity=context.get("character", "The character"), namespace=self._damage_namespace(context))
+    
+    def astream_damage_description(self, context: Dict[str, Any]) -> AsyncIterator[str]:
+        """Async version of stream_damage_description"""
+        return self._agenerate_text(self._damage_prompt(context), max_tokens=100, temperature=0.7,
+                                    stop_after_chars=NARRATION_STOP_CHARS,
+                                    entity=context.get("character", "The character"), namespace=self._damage_namespace(context))
+    
+    async def agenerate_damage_description(self, context: Dict[str, Any]) -> str:
+        """Async version of generate_damage_description"""
+        return await self.agenerate_text(self._damage_prompt(context), 100, 0.7, NARRATION_STOP_CHARS,
+                                         context.get("character", "The character"), self._damage_namespace(context))
+    
+    @staticmethod
+    def _damage_severity(context: Dict[str, Any]) -> str:
+        """Classify damage as unconscious, severe or wounded"""
+        if context.get("unconscious", False):
+            return "unconscious"
+        if context.get("new_hp", 0) <= context.get("old_hp", 0) // 4:
+            return "severe"
+        return "wounded"
+    
+    @classmethod
+    def _damage_namespace(cls, context: Dict[str, Any]) -> str:
+        """Semantic cache namespace: damage type and severity"""
+        return f"damage:{context.get('damage_type', 'physical')}:{cls._damage_severity(context)}"
+    
+    @classmethod
+    def _damage_prompt(cls, context: Dict[str, Any]) -> str:
+        """Build the damage narration prompt"""
         character = context.get("character", "The character")
         damage = context.get("damage", 0)
         damage_type = context.get("damage_type", "physical")
         old_hp = context.get("old_hp", 0)
         new_hp = context.get("new_hp", 0)
-        unconscious = context.get("unconscious", False)
+        severity = cls._damage_severity(context)
         
-        if unconscious:
-            prompt = f"""
-            Describe {character} taking {damage} {damage_type} damage and falling unconscious 
-            (from {old_hp} to {new_hp} HP). Make it dramatic but not graphic. 1-2 sentences.
-            """
-        elif new_hp <= old_hp // 4:  # Severely injured
-            prompt = f"""
-            Describe {character} taking {damage} {damage_type} damage and being severely wounded 
-            (from {old_hp} to {new_hp} HP). Show they're badly hurt. 1-2 sentences.
-            """
+        if severity == "unconscious":
+            prompt = DAMAGE_UNCONSCIOUS_TMPL.format(character=character, damage=damage, damage_type=damage_type,
+                                                    old_hp=old_hp, new_hp=new_hp)
+        elif severity == "severe":
+            prompt = DAMAGE_SEVERE_TMPL.format(character=character, damage=damage, damage_type=damage_type,
+                                               old_hp=old_hp, new_hp=new_hp)
         else:
-            prompt = f"""
-            Describe {character} taking {damage} {damage_type} damage 
-            (from {old_hp} to {new_hp} HP). 1-2 sentences.
-            """
+            prompt = DAMAGE_TMPL.format(character=character, damage=damage, damage_type=damage_type,
+                                        old_hp=old_hp, new_hp=new_hp)
         
-        return self._generate_text(prompt, max_tokens=100, temperature=0.7)
+        return prompt
     
     def generate_healing_description(self, context: Dict[str, Any]) -> str:
+        """Generate a narrative description of healing (see stream_healing_description)"""
+        return "".join(self.stream_healing_description(context)).strip()
+    
+    def stream_healing_description(self, context: Dict[str, Any]) -> Iterator[str]:
         """
-        Generate a narrative description of healing
+        Stream a narrative description of healing
         
         Args:
             context: Dictionary with healing details
@@ -188,30 +838,58 @@ class LMStudioClient:
                 - new_hp: HP after healing
                 - max_hp: Maximum HP
         """
+        return self._generate_text(self._healing_prompt(context), max_tokens=100, temperature=0.7,
+                                   stop_after_chars=NARRATION_STOP_CHARS,
+                                   entity=context.get("character", "The character"), namespace=self._healing_namespace(context))
+    
+    def astream_healing_description(self, context: Dict[str, Any]) -> AsyncIterator[str]:
+        """Async version of stream_healing_description"""
+        return self._agenerate_text(self._healing_prompt(context), max_tokens=100, temperature=0.7,
+                                    stop_after_chars=NARRATION_STOP_CHARS,
+                                    entity=context.get("character", "The character"), namespace=self._healing_namespace(context))
+    
+    async def agenerate_healing_description(self, context: Dict[str, Any]) -> str:
+        """Async version of generate_healing_description"""
+        return await self.agenerate_text(self._healing_prompt(context), 100, 0.7, NARRATION_STOP_CHARS,
+                                         context.get("character", "The character"), self._healing_namespace(context))
+    
+    @staticmethod
+    def _healing_recovery(context: Dict[str, Any]) -> str:
+        """Classify healing as full, major or partial recovery"""
+        old_hp = context.get("old_hp", 0)
+        new_hp = context.get("new_hp", 0)
+        max_hp = context.get("max_hp", 100)
+        if new_hp >= max_hp:
+            return "full"
+        if old_hp <= max_hp // 4 and new_hp > max_hp // 2:
+            return "major"
+        return "partial"
+    
+    @classmethod
+    def _healing_namespace(cls, context: Dict[str, Any]) -> str:
+        """Semantic cache namespace: healing type and recovery"""
+        return f"healing:{context.get('heal_type', 'magical')}:{cls._healing_recovery(context)}"
+    
+    @classmethod
+    def _healing_prompt(cls, context: Dict[str, Any]) -> str:
+        """Build the healing narration prompt"""
         character = context.get("character", "The character")
         healing = context.get("healing", 0)
         heal_type = context.get("heal_type", "magical")
         old_hp = context.get("old_hp", 0)
         new_hp = context.get("new_hp", 0)
-        max_hp = context.get("max_hp", 100)
+        recovery = cls._healing_recovery(context)
         
-        if new_hp >= max_hp:
-            prompt = f"""
-            Describe {character} being fully healed by {heal_type} healing 
-            (from {old_hp} to {new_hp} HP). They're completely restored. 1-2 sentences.
-            """
-        elif old_hp <= max_hp // 4 and new_hp > max_hp // 2:  # Major recovery
-            prompt = f"""
-            Describe {character} receiving {healing} points of {heal_type} healing, 
-            making a major recovery (from {old_hp} to {new_hp} HP). 1-2 sentences.
-            """
+        if recovery == "full":
+            prompt = HEAL_FULL_TMPL.format(character=character, heal_type=heal_type, old_hp=old_hp, new_hp=new_hp)
+        elif recovery == "major":
+            prompt = HEAL_MAJOR_TMPL.format(character=character, healing=healing, heal_type=heal_type,
+                                            old_hp=old_hp, new_hp=new_hp)
         else:
-            prompt = f"""
-            Describe {character} receiving {healing} points of {heal_type} healing 
-            (from {old_hp} to {new_hp} HP). 1-2 sentences.
-            """
+            prompt = HEAL_TMPL.format(character=character, healing=healing, heal_type=heal_type,
+                                      old_hp=old_hp, new_hp=new_hp)
         
-        return self._generate_text(prompt, max_tokens=100, temperature=0.7)
+        return prompt
     
     def generate_npc_dialogue(self, npc_name: str, situation: str, personality: str = "friendly") -> str:
         """
@@ -222,14 +900,18 @@ class LMStudioClient:
             situation: Current situation or context
             personality: NPC personality (friendly, hostile, mysterious, etc.)
         """
-        prompt = f"""
-        As {npc_name}, a {personality} NPC, respond to this situation: {situation}
-        
-        Speak in character with appropriate tone and mannerisms. 
-        Keep it to 1-3 sentences and include dialogue in quotes.
-        """
-        
-        return self._generate_text(prompt, max_tokens=150, temperature=0.9)
+        return self._generate_text_sync(self._npc_dialogue_prompt(npc_name, situation, personality),
+                                        max_tokens=150, temperature=0.9)
+    
+    async def agenerate_npc_dialogue(self, npc_name: str, situation: str, personality: str = "friendly") -> str:
+        """Async version of generate_npc_dialogue"""
+        return await self.agenerate_text(self._npc_dialogue_prompt(npc_name, situation, personality),
+                                         max_tokens=150, temperature=0.9)
+    
+    @staticmethod
+    def _npc_dialogue_prompt(npc_name: str, situation: str, personality: str) -> str:
+        """Build the NPC dialogue prompt"""
+        return NPC_DIALOGUE_TMPL.format(npc_name=npc_name, personality=personality, situation=situation)
     
     def generate_environment_description(self, location_type: str, mood: str = "neutral", 
                                        special_features: List[str] = None) -> str:
@@ -241,17 +923,23 @@ class LMStudioClient:
             mood: Desired mood (dark, cheerful, mysterious, etc.)
             special_features: List of special features to include
         """
+        return self._generate_text_sync(self._environment_prompt(location_type, mood, special_features),
+                                        max_tokens=200, temperature=0.8)
+    
+    async def agenerate_environment_description(self, location_type: str, mood: str = "neutral",
+                                                special_features: List[str] = None) -> str:
+        """Async version of generate_environment_description"""
+        return await self.agenerate_text(self._environment_prompt(location_type, mood, special_features),
+                                         max_tokens=200, temperature=0.8)
+    
+    @staticmethod
+    def _environment_prompt(location_type: str, mood: str, special_features: Optional[List[str]]) -> str:
+        """Build the environment description prompt"""
         features_text = ""
         if special_features:
             features_text = f"Include these features: {', '.join(special_features)}. "
         
-        prompt = f"""
-        Describe a {mood} {location_type} that the party encounters. 
-        {features_text}Make it atmospheric and immersive. 
-        Keep it to 2-3 sentences, focusing on what the characters see, hear, and smell.
-        """
-        
-        return self._generate_text(prompt, max_tokens=200, temperature=0.8)
+        return ENVIRONMENT_TMPL.format(mood=mood, location_type=location_type, features_text=features_text)
     
     def generate_quest_hook(self, quest_type: str = "mystery", difficulty: str = "medium") -> str:
         """
@@ -261,14 +949,18 @@ class LMStudioClient:
             quest_type: Type of quest (mystery, rescue, exploration, etc.)
             difficulty: Quest difficulty level
         """
-        prompt = f"""
-        Create a {difficulty} difficulty {quest_type} quest hook for a D&D party. 
-        Include the problem, potential rewards, and what makes it urgent or interesting. 
-        Keep it to 2-3 sentences.
-        """
-        
-        return self._generate_text(prompt, max_tokens=200, temperature=0.9)
-
+        return self._generate_text_sync(self._quest_hook_prompt(quest_type, difficulty),
+                                        max_tokens=200, temperature=0.9)
+    
+    async def agenerate_quest_hook(self, quest_type: str = "mystery", difficulty: str = "medium") -> str:
+        """Async version of generate_quest_hook"""
+        return await self.agenerate_text(self._quest_hook_prompt(quest_type, difficulty),
+                                         max_tokens=200, temperature=0.9)
+    
+    @staticmethod
+    def _quest_hook_prompt(quest_type: str, difficulty: str) -> str:
+        """Build the quest hook prompt"""
+        return QUEST_HOOK_TMPL.format(difficulty=difficulty, quest_type=quest_type)
 
 if __name__ == "__main__":
     # Test the LM Studio client
@@ -5,16 +5,17 @@ Integrates dice engine, database, and LM Studio for complete D&D gameplay
 
 import asyncio
 import json
-from typing import Dict, List, Optional, Any
-from dataclasses import asdict
+import os
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Any, Tuple
 from pathlib import Path
 
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import Context, FastMCP
 from pydantic import BaseModel, Field
 
-from dice_engine import DiceEngine, AdvantageType, AttackResult, DiceResult
+from dice_engine import DiceEngine, AttackResult, DiceResult, parse_advantage
 from database import DatabaseManager, Character
-from lm_studio_client import LMStudioClient
+from lm_studio_client import LMStudioClient, coalesce_chunks
 
 
 class AttackResultResponse(BaseModel):
@@ -52,11 +53,59 @@ class DiceRollResponse(BaseModel):
     critical: bool = False
 
 
+def _character_response(character: Character) -> CharacterResponse:
+    """Build the tool response for a character"""
+    return CharacterResponse(
+        id=character.id,
+        name=character.name,
+        character_class=character.character_class,
+        level=character.level,
+        hp_current=character.hp_current,
+        hp_max=character.hp_max,
+        ac=character.ac,
+        stats=character.stats
+    )
+
+
+# TALEKEEPER_NARRATIVE=0 makes the combat tools skip LM Studio narration by default
+NARRATIVE_DEFAULT = os.environ.get("TALEKEEPER_NARRATIVE", "1") != "0"
+
+ABILITY_NAMES = ("STR", "DEX", "CON", "INT", "WIS", "CHA")
+_ABILITY_LINE = "- **{}:** {} ({:+d})".format
+
+
 # Initialize components
 dice_engine = DiceEngine()
 database = DatabaseManager()
 lm_client = LMStudioClient()
 
+
+# list_characters responses, valid while database.db_version is unchanged
+_LIST_CACHE = {"version": None, "payload": None}
+
+
+# Seconds a looked-up character is reused; other processes share the SQLite file,
+# so their HP and XP writes show up after at most this long
+CHARACTER_CACHE_TTL = 1.0
+
+# Characters by name for _get_char_cached: (expires_at, character)
+_CHAR_CACHE: Dict[str, Tuple[float, Character]] = {}
+
+
+def _get_char_cached(name: str) -> Optional[Character]:
+    """Look up a character by name, reusing a hit for CHARACTER_CACHE_TTL seconds (misses are never cached)"""
+    now = time.monotonic()
+    entry = _CHAR_CACHE.get(name)
+    if entry is not None and entry[0] > now:
+        return entry[1]
+    
+    character = database.get_character_by_name(name)
+    if character is None:
+        _CHAR_CACHE.pop(name, None)
+    else:
+        _CHAR_CACHE[name] = (now + CHARACTER_CACHE_TTL, character)
+    return character
+
 # Create FastMCP server
 mcp = FastMCP("TaleKeeper")
 
@@ -70,7 +119,7 @@ def roll_d20(modifier: int = 0, advantage: str = "normal") -> DiceRollResponse:
         modifier: Bonus or penalty to add to the roll
         advantage: "normal", "advantage", or "disadvantage"
     """
-    adv_type = AdvantageType(advantage.lower())
+    adv_type = parse_advantage(advantage)
     result = dice_engine.roll_d20(modifier, adv_type)
     
     return DiceRollResponse(
@@ -103,9 +152,20 @@ def roll_damage(dice_string: str, bonus_modifier: int = 0) -> DiceRollResponse:
     )
 
 
+async def _stream_description(chunks: AsyncIterator[str], ctx: Context) -> str:
+    """Forward narrative chunks to the client as they arrive, return the full text"""
+    parts = []
+    # One notification per ~20ms of tokens rather than one per token
+    async for chunk in coalesce_chunks(chunks):
+        parts.append(chunk)
+        await ctx.info(chunk)
+    return "".join(parts).strip()
+
+
 @mcp.tool()
-def roll_attack(character_name: str, target_ac: int, attack_bonus: int,
-               damage_dice: str, advantage: str = "normal") -> AttackResultResponse:
+async def roll_attack(character_name: str, target_ac: int, attack_bonus: int,
+                      damage_dice: str, advantage: str = "normal",
+                      include_narrative: bool = NARRATIVE_DEFAULT) -> AttackResultResponse:
     """
     Roll an attack for a character against a target AC with damage
     
@@ -115,8 +175,39 @@ def roll_attack(character_name: str, target_ac: int, attack_bonus: int,
         attack_bonus: Total attack bonus (ability + proficiency + magic)
         damage_dice: Damage dice notation (e.g., '1d8+4')
         advantage: "normal", "advantage", or "disadvantage"
+        include_narrative: Generate an LM Studio description (False for a one-line summary)
     """
-    adv_type = AdvantageType(advantage.lower())
+    response, context = _resolve_attack(character_name, target_ac, attack_bonus, damage_dice, advantage)
+    if include_narrative:
+        response.description = await lm_client.agenerate_combat_description(context)
+    else:
+        response.description = f"{character_name} {'hits' if response.hit else 'misses'}."
+    return response
+
+
+@mcp.tool()
+async def roll_attack_stream(character_name: str, target_ac: int, attack_bonus: int,
+                             damage_dice: str, ctx: Context,
+                             advantage: str = "normal") -> AttackResultResponse:
+    """
+    Same as roll_attack, but streams the narrative to the client as it is generated
+    
+    Args:
+        character_name: Name of attacking character
+        target_ac: Target's Armor Class
+        attack_bonus: Total attack bonus (ability + proficiency + magic)
+        damage_dice: Damage dice notation (e.g., '1d8+4')
+        advantage: "normal", "advantage", or "disadvantage"
+    """
+    response, context = _resolve_attack(character_name, target_ac, attack_bonus, damage_dice, advantage)
+    response.description = await _stream_description(lm_client.astream_combat_description(context), ctx)
+    return response
+
+
+def _resolve_attack(character_name: str, target_ac: int, attack_bonus: int,
+                    damage_dice: str, advantage: str) -> Tuple[AttackResultResponse, Dict[str, Any]]:
+    """Roll an attack and its damage; returns the response (without description) and narrative context"""
+    adv_type = parse_advantage(advantage)
     
     # Roll attack
     attack_result = dice_engine.calculate_attack(attack_bonus, target_ac, adv_type)
@@ -145,9 +236,7 @@ def roll_attack(character_name: str, target_ac: int, attack_bonus: int,
         "damage": damage_total
     }
     
-    description = lm_client.generate_combat_description(context)
-    
-    return AttackResultResponse(
+    response = AttackResultResponse(
         hit=attack_result.hit,
         attack_total=attack_result.attack_roll.total,
         attack_roll=attack_result.attack_roll.rolls[0],
@@ -156,8 +245,10 @@ def roll_attack(character_name: str, target_ac: int, attack_bonus: int,
         damage_rolls=damage_rolls,
         critical_hit=attack_result.critical_hit,
         target_ac=target_ac,
-        description=description
+        description=""
     )
+    
+    return response, context
 
 
 @mcp.tool()
@@ -205,17 +296,9 @@ def create_character(name: str, player_name: str, character_class: str,
     }
     
     character = database.create_character(char_data)
+    _CHAR_CACHE.clear()
     
-    return CharacterResponse(
-        id=character.id,
-        name=character.name,
-        character_class=character.character_class,
-        level=character.level,
-        hp_current=character.hp_current,
-        hp_max=character.hp_max,
-        ac=character.ac,
-        stats=character.stats
-    )
+    return _character_response(character)
 
 
 @mcp.tool()
@@ -226,42 +309,58 @@ def get_character(character_name: str) -> Optional[CharacterResponse]:
     Args:
         character_name: Name of the character to retrieve
     """
-    character = database.get_character_by_name(character_name)
+    character = _get_char_cached(character_name)
     
     if not character:
         return None
     
-    return CharacterResponse(
-        id=character.id,
-        name=character.name,
-        character_class=character.character_class,
-        level=character.level,
-        hp_current=character.hp_current,
-        hp_max=character.hp_max,
-        ac=character.ac,
-        stats=character.stats
-    )
+    return _character_response(character)
 
 
 @mcp.tool()
 def list_characters() -> List[CharacterResponse]:
     """List all characters in the database"""
-    characters = database.list_characters()
+    # Rebuild only when a character has been written since the last call
+    if _LIST_CACHE["version"] != database.db_version:
+        version = database.db_version
+        _LIST_CACHE["payload"] = [_character_response(char) for char in database.list_characters()]
+        _LIST_CACHE["version"] = version
+    
+    return _LIST_CACHE["payload"]
+
+
+async def _write_while_narrating(write: Callable[[], Tuple[bool, int]], predicted_hp: int,
+                                 make_context: Callable[[int], Dict[str, Any]],
+                                 generate: Callable[[Dict[str, Any]], Awaitable[str]]) -> Tuple[bool, int, str]:
+    """
+    Run an HP write in a worker thread while the narrative for the predicted HP generates
+    
+    Returns (success, new_hp, description). If the stored HP differs from the
+    prediction (another write landed first), the narrative is regenerated.
+    """
+    narration = asyncio.create_task(generate(make_context(predicted_hp)))
+    try:
+        success, new_hp = await asyncio.to_thread(write)
+    except BaseException:
+        # Don't leave the speculative POST running with nobody to collect its result
+        narration.cancel()
+        raise
+    _CHAR_CACHE.clear()
+    
+    if not success:
+        narration.cancel()
+        return False, new_hp, ""
     
-    return [CharacterResponse(
-        id=char.id,
-        name=char.name,
-        character_class=char.character_class,
-        level=char.level,
-        hp_current=char.hp_current,
-        hp_max=char.hp_max,
-        ac=char.ac,
-        stats=char.stats
-    ) for char in characters]
+    if new_hp != predicted_hp:
+        narration.cancel()
+        return True, new_hp, await generate(make_context(new_hp))
+    
+    return True, new_hp, await narration
 
 
 @mcp.tool()
-def damage_character(character_name: str, damage: int, damage_type: str = "physical") -> Dict[str, Any]:
+async def damage_character(character_name: str, damage: int, damage_type: str = "physical",
+                           include_narrative: bool = NARRATIVE_DEFAULT) -> Dict[str, Any]:
     """
     Apply damage to a character
     
@@ -269,32 +368,75 @@ def damage_character(character_name: str, damage: int, damage_type: str = "physi
         character_name: Name of character taking damage
         damage: Amount of damage
         damage_type: Type of damage (for narrative purposes)
+        include_narrative: Generate an LM Studio description (False for a one-line summary)
     """
-    character = database.get_character_by_name(character_name)
+    character = _get_char_cached(character_name)
+    
+    if not character:
+        return {"success": False, "error": f"Character '{character_name}' not found"}
+    
+    success, new_hp, description = await _write_while_narrating(
+        lambda: database.damage_character(character.id, damage),
+        max(0, character.hp_current - damage),
+        lambda hp: _damage_context(character, damage, damage_type, hp),
+        lm_client.agenerate_damage_description if include_narrative else _plain_damage_description
+    )
+    
+    if not success:
+        return {"success": False, "error": "Failed to apply damage"}
+    
+    return _damage_result(character, damage, new_hp, description)
+
+
+@mcp.tool()
+async def damage_character_stream(character_name: str, damage: int, ctx: Context,
+                                  damage_type: str = "physical") -> Dict[str, Any]:
+    """
+    Same as damage_character, but streams the narrative to the client as it is generated
+    
+    Args:
+        character_name: Name of character taking damage
+        damage: Amount of damage
+        damage_type: Type of damage (for narrative purposes)
+    """
+    character = _get_char_cached(character_name)
     
     if not character:
         return {"success": False, "error": f"Character '{character_name}' not found"}
     
     success, new_hp = database.damage_character(character.id, damage)
+    _CHAR_CACHE.clear()
     
     if not success:
         return {"success": False, "error": "Failed to apply damage"}
     
-    # Generate narrative description
-    context = {
-        "character": character_name,
+    context = _damage_context(character, damage, damage_type, new_hp)
+    description = await _stream_description(lm_client.astream_damage_description(context), ctx)
+    return _damage_result(character, damage, new_hp, description)
+
+
+def _damage_context(character: Character, damage: int, damage_type: str, new_hp: int) -> Dict[str, Any]:
+    """Narrative context for a character taking damage"""
+    return {
+        "character": character.name,
         "damage": damage,
         "damage_type": damage_type,
         "old_hp": character.hp_current,
         "new_hp": new_hp,
         "unconscious": new_hp <= 0
     }
-    
-    description = lm_client.generate_damage_description(context)
-    
+
+
+async def _plain_damage_description(context: Dict[str, Any]) -> str:
+    """One-line damage summary used when narration is turned off"""
+    return f"{context['character']} takes {context['damage']} {context['damage_type']} damage."
+
+
+def _damage_result(character: Character, damage: int, new_hp: int, description: str) -> Dict[str, Any]:
+    """Tool response for a character taking damage"""
     return {
         "success": True,
-        "character": character_name,
+        "character": character.name,
         "damage_taken": damage,
         "old_hp": character.hp_current,
         "new_hp": new_hp,
@@ -304,7 +446,8 @@ def damage_character(character_name: str, damage: int, damage_type: str = "physi
 
 
 @mcp.tool()
-def heal_character(character_name: str, healing: int, heal_type: str = "magical") -> Dict[str, Any]:
+async def heal_character(character_name: str, healing: int, heal_type: str = "magical",
+                         include_narrative: bool = NARRATIVE_DEFAULT) -> Dict[str, Any]:
     """
     Heal a character
     
@@ -312,32 +455,75 @@ def heal_character(character_name: str, healing: int, heal_type: str = "magical"
         character_name: Name of character being healed
         healing: Amount of healing
         heal_type: Type of healing (for narrative purposes)
+        include_narrative: Generate an LM Studio description (False for a one-line summary)
     """
-    character = database.get_character_by_name(character_name)
+    character = _get_char_cached(character_name)
+    
+    if not character:
+        return {"success": False, "error": f"Character '{character_name}' not found"}
+    
+    success, new_hp, description = await _write_while_narrating(
+        lambda: database.heal_character(character.id, healing),
+        min(character.hp_max, character.hp_current + healing),
+        lambda hp: _healing_context(character, healing, heal_type, hp),
+        lm_client.agenerate_healing_description if include_narrative else _plain_healing_description
+    )
+    
+    if not success:
+        return {"success": False, "error": "Failed to apply healing"}
+    
+    return _healing_result(character, healing, new_hp, description)
+
+
+@mcp.tool()
+async def heal_character_stream(character_name: str, healing: int, ctx: Context,
+                                heal_type: str = "magical") -> Dict[str, Any]:
+    """
+    Same as heal_character, but streams the narrative to the client as it is generated
+    
+    Args:
+        character_name: Name of character being healed
+        healing: Amount of healing
+        heal_type: Type of healing (for narrative purposes)
+    """
+    character = _get_char_cached(character_name)
     
     if not character:
         return {"success": False, "error": f"Character '{character_name}' not found"}
     
     success, new_hp = database.heal_character(character.id, healing)
+    _CHAR_CACHE.clear()
     
     if not success:
         return {"success": False, "error": "Failed to apply healing"}
     
-    # Generate narrative description
-    context = {
-        "character": character_name,
+    context = _healing_context(character, healing, heal_type, new_hp)
+    description = await _stream_description(lm_client.astream_healing_description(context), ctx)
+    return _healing_result(character, healing, new_hp, description)
+
+
+def _healing_context(character: Character, healing: int, heal_type: str, new_hp: int) -> Dict[str, Any]:
+    """Narrative context for a character being healed"""
+    return {
+        "character": character.name,
         "healing": healing,
         "heal_type": heal_type,
         "old_hp": character.hp_current,
         "new_hp": new_hp,
         "max_hp": character.hp_max
     }
-    
-    description = lm_client.generate_healing_description(context)
-    
+
+
+async def _plain_healing_description(context: Dict[str, Any]) -> str:
+    """One-line healing summary used when narration is turned off"""
+    return f"{context['character']} recovers {context['healing']} HP."
+
+
+def _healing_result(character: Character, healing: int, new_hp: int, description: str) -> Dict[str, Any]:
+    """Tool response for a character being healed"""
     return {
         "success": True,
-        "character": character_name,
+        "character": character.name,
         "healing_received": healing,
         "old_hp": character.hp_current,
         "new_hp": new_hp,
@@ -355,26 +541,21 @@ def start_combat(encounter_name: str, participants: List[str], description: str
         participants: List of character names participating
         description: Description of the encounter
     """
-    # Validate all participants exist
-    character_ids = []
+    # Validate all participants exist, fetching each once
+    characters = {}
     for name in participants:
-        character = database.get_character_by_name(name)
+        if name in characters:
+            continue
+        character = _get_char_cached(name)
         if not character:
             return {"success": False, "error": f"Character '{name}' not found"}
-        character_ids.append(character.id)
+        characters[name] = character
     
-    encounter = database.create_encounter(encounter_name, description, character_ids)
-    
-    # Generate initiative order (simplified - could be expanded)
-    initiative_order = []
-    for name in participants:
-        character = database.get_character_by_name(name)
-        dex_mod = character.modifiers.get('DEX', 0)
-        initiative_roll = dice_engine.roll_initiative(dex_mod)
-        initiative_order.append((character.id, initiative_roll.total))
-    
-    # Sort by initiative (highest first)
-    initiative_order.sort(key=lambda x: x[1], reverse=True)
+    # Roll everyone's initiative in one vectorised draw, then sort (highest first)
+    character_ids = [character.id for character in characters.values()]
+    _, totals = dice_engine.roll_initiative_batch([c.modifiers.get('DEX', 0) for c in characters.values()])
+    initiative_order = sorted(zip(character_ids, totals.tolist()), key=lambda x: x[1], reverse=True)
+    encounter = database.create_encounter(encounter_name, description, character_ids, initiative_order)
     
     return {
         "success": True,
@@ -398,13 +579,13 @@ def roll_saving_throw(character_name: str, save_type: str, dc: int, advantage: s
         dc: Difficulty Class to beat
         advantage: "normal", "advantage", or "disadvantage"
     """
-    character = database.get_character_by_name(character_name)
+    character = _get_char_cached(character_name)
     
     if not character:
         return {"success": False, "error": f"Character '{character_name}' not found"}
     
     save_bonus = character.saving_throws.get(save_type.upper(), 0)
-    adv_type = AdvantageType(advantage.lower())
+    adv_type = parse_advantage(advantage)
     
     success, roll_result = dice_engine.calculate_saving_throw(save_bonus, dc, adv_type)
     
@@ -431,12 +612,13 @@ def add_experience(character_name: str, xp_amount: int, source: str = "adventure
         xp_amount: Amount of XP to add
         source: Source of the XP (combat, quest, roleplay, etc.)
     """
-    character = database.get_character_by_name(character_name)
+    character = _get_char_cached(character_name)
     
     if not character:
         return {"success": False, "error": f"Character '{character_name}' not found"}
     
     xp_entry = database.add_experience(character.id, xp_amount, source)
+    _CHAR_CACHE.clear()
     
     return {
         "success": True,
@@ -451,11 +633,17 @@ def add_experience(character_name: str, xp_amount: int, source: str = "adventure
 @mcp.resource("character://{character_name}")
 def get_character_sheet(character_name: str) -> str:
     """Get a full character sheet as a resource"""
-    character = database.get_character_by_name(character_name)
+    character = _get_char_cached(character_name)
     
     if not character:
         return f"Character '{character_name}' not found"
     
+    # Modifiers are stored on the character; render the six ability lines from them in one pass
+    stats, modifiers = character.stats, character.modifiers
+    ability_lines = "\n".join(_ABILITY_LINE(name, stats.get(name, 10), modifiers.get(name, 0))
+                              for name in ABILITY_NAMES)
+    equipment_lines = "\n".join([f"- {item}" for item in character.equipment])
+    
     # Format character sheet
     sheet = f"""
 # {character.name}
@@ -470,15 +658,10 @@ def get_character_sheet(character_name: str) -> str:
 - **Proficiency Bonus:** +{character.proficiency_bonus}
 
 ## Ability Scores
-- **STR:** {character.stats.get('STR', 10)} ({character.modifiers.get('STR', 0):+d})
-- **DEX:** {character.stats.get('DEX', 10)} ({character.modifiers.get('DEX', 0):+d})
-- **CON:** {character.stats.get('CON', 10)} ({character.modifiers.get('CON', 0):+d})
-- **INT:** {character.stats.get('INT', 10)} ({character.modifiers.get('INT', 0):+d})
-- **WIS:** {character.stats.get('WIS', 10)} ({character.modifiers.get('WIS', 0):+d})
-- **CHA:** {character.stats.get('CHA', 10)} ({character.modifiers.get('CHA', 0):+d})
+{ability_lines}
 
 ## Equipment
-{chr(10).join(f"- {item}" for item in character.equipment)}
+{equipment_lines}
 
 ## Notes
 {character.notes}
@@ -510,11 +693,14 @@ if __name__ == "__main__":
     print("- roll_d20: Roll a d20 with modifiers and advantage")
     print("- roll_damage: Roll damage dice")
     print("- roll_attack: Complete attack roll with damage")
+    print("- roll_attack_stream: roll_attack with a streamed narrative")
     print("- create_character: Create a new D&D character")
     print("- get_character: Get character information")
     print("- list_characters: List all characters")
     print("- damage_character: Apply damage to a character")
+    print("- damage_character_stream: damage_character with a streamed narrative")
     print("- heal_character: Heal a character")
+    print("- heal_character_stream: heal_character with a streamed narrative")
     print("- start_combat: Begin a combat encounter")
     print("- roll_saving_throw: Roll saving throws")
     print("- add_experience: Award experience points")
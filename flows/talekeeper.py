@@ -4,22 +4,66 @@ Coordinates dice engine, database, LM Studio, and MCP server.
 """
 
 import asyncio
+import concurrent.futures
+import dataclasses
+import functools
 import logging
-from typing import Dict, List, Optional, Any, Tuple
+from collections import OrderedDict
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Any, Tuple, TypeVar
 from pathlib import Path
 import sys
 
+import numpy as np
+
 # Add core directory to path for imports
 sys.path.append(str(Path(__file__).parent.parent / "core"))
 
-from dice_engine import DiceEngine, AdvantageType
-from database import DatabaseManager, Character
-from lm_studio_client import LMStudioClient
+from dice_engine import DiceEngine, AdvantageType, AttackResult, parse_advantage
+from database import DatabaseManager, Character, READ_POOL_SIZE
+from lm_studio_client import LMStudioClient, coalesce_chunks
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+# Most blocking database calls one event loop runs in worker threads at once
+DB_THREAD_LIMIT = READ_POOL_SIZE
+
+# Most compiled attack profiles kept; the least recently used is dropped beyond this
+ATTACK_PROFILE_CACHE_SIZE = 256
+
+# roll(target_ac, advantage) -> (attack_result, damage or None on a miss)
+AttackProfile = Callable[[int, AdvantageType], Tuple[AttackResult, Optional[int]]]
+
+_REQUIRED_CHARACTER_FIELDS = frozenset({"name", "player_name", "character_class", "hp_max"})
+
+# Party status by HP percentage: np.digitize(..., right=True) maps <=0, <=25, <=50, above
+_PARTY_STATUS_BINS = np.array([0.0, 25.0, 50.0])
+_PARTY_STATUS = np.array(["unconscious", "critical", "wounded", "healthy"])
+
+# Save odds tables cover every ability and these DCs
+_SAVE_INDEX = {ability: i for i, ability in enumerate(("STR", "DEX", "CON", "INT", "WIS", "CHA"))}
+_SAVE_DCS = np.arange(1, 31)
+
+
+@dataclasses.dataclass(slots=True)
+class AttackOutcome:
+    """Result of one attack, filled in as it resolves and returned as a dict"""
+    attacker: str
+    target: str
+    weapon: str
+    hit: bool
+    attack_roll: int
+    target_ac: int
+    critical_hit: bool
+    damage: int = 0
+    target_hp_before: int = 0
+    target_hp_after: int = 0
+    target_unconscious: bool = False
+    narrative: str = ""
+
 
 class TaleKeeper:
     """
@@ -32,21 +76,108 @@ class TaleKeeper:
         self.dice_engine = DiceEngine()
         self.database = DatabaseManager(db_path)
         self.lm_client = LMStudioClient(lm_studio_url)
+        # Attack rollers by (attack_bonus, damage_dice), see compile_attack_profile
+        self._attack_profiles: "OrderedDict[Tuple[int, str], AttackProfile]" = OrderedDict()
+        # In-flight run_latest tasks by category
+        self._latest: Dict[str, asyncio.Task] = {}
+        # Save success odds for the current encounter's participants, see save_success_probability
+        self._save_odds_index: Dict[str, int] = {}
+        self._save_odds: Dict[AdvantageType, np.ndarray] = {}
+        # Worker thread slots for _db, one semaphore per event loop
+        self._db_slots: Dict[asyncio.AbstractEventLoop, asyncio.Semaphore] = {}
         
         logger.info("TaleKeeper initialized successfully")
     
+    def close(self):
+        """Release LM Studio connections and close the database"""
+        self.lm_client.close()
+        self.database.close()
+    
+    async def aclose(self):
+        """Async version of close, for use on a running event loop"""
+        await self.lm_client.aclose()
+        self.database.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+    
+    async def run_latest(self, category: str, coro: Awaitable[T]) -> T:
+        """
+        Await coro, cancelling any earlier call still running in the same category
+        
+        For interactive front ends: when a user fires several commands of one kind
+        (e.g. "attack") quickly, only the latest keeps generating narrative; the
+        cancelled ones raise asyncio.CancelledError and their LM Studio requests are
+        aborted. DB writes already handed to a worker thread still complete.
+        """
+        previous = self._latest.get(category)
+        if previous is not None:
+            previous.cancel()
+        
+        task = asyncio.ensure_future(coro)
+        self._latest[category] = task
+        try:
+            return await task
+        finally:
+            if self._latest.get(category) is task:
+                del self._latest[category]
+    
+    def _run(self, coro: Awaitable[T]) -> T:
+        """
+        Run coro for a sync wrapper, closing its event loop's LM Studio connections before the loop ends
+        
+        Called from a running event loop (where asyncio.run is not allowed), coro runs on
+        a worker thread's loop instead and the caller blocks like any sync call; use the
+        async variant there to keep the loop responsive.
+        """
+        async def run():
+            try:
+                return await coro
+            finally:
+                await self.lm_client.arelease()
+        
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(run())
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+            return pool.submit(asyncio.run, run()).result()
+    
+    async def _db(self, func: Callable[..., T], *args) -> T:
+        """Run a blocking database call in a worker thread, at most DB_THREAD_LIMIT at a time"""
+        loop = asyncio.get_running_loop()
+        slots = self._db_slots.get(loop)
+        if slots is None:
+            for closed in [other for other in self._db_slots if other.is_closed()]:
+                del self._db_slots[closed]
+            slots = self._db_slots[loop] = asyncio.Semaphore(DB_THREAD_LIMIT)
+        async with slots:
+            return await asyncio.to_thread(func, *args)
+    
     def create_character(self, character_data: Dict[str, Any]) -> Character:
+        """Create a new character with validation and setup (sync wrapper for acreate_character)"""
+        return self._run(self.acreate_character(character_data))
+    
+    async def acreate_character(self, character_data: Dict[str, Any]) -> Character:
         """Create a new character with validation and setup"""
         logger.info(f"Creating character: {character_data.get('name')}")
         
         # Validate required fields
-        required_fields = ['name', 'player_name', 'character_class', 'hp_max']
-        for field in required_fields:
-            if field not in character_data:
-                raise ValueError(f"Missing required field: {field}")
+        missing = _REQUIRED_CHARACTER_FIELDS - character_data.keys()
+        if missing:
+            raise ValueError(f"Missing required field: {', '.join(sorted(missing))}")
         
         # Create character in database
-        character = self.database.create_character(character_data)
+        character = await self._db(self.database.create_character, character_data)
         
         # Generate welcome narrative
         context = {
@@ -55,7 +186,7 @@ class TaleKeeper:
             "background": character.background
         }
         
-        welcome_msg = self.lm_client.generate_npc_dialogue(
+        welcome_msg = await self.lm_client.agenerate_npc_dialogue(
             "The Narrator", 
             f"Welcome {character.name} the {character.character_class} to our adventure",
             "welcoming"
@@ -69,6 +200,13 @@ class TaleKeeper:
     def process_attack(self, attacker_name: str, target_name: str, weapon: str = "sword", 
                       attack_bonus: int = 5, damage_dice: str = "1d8+3", 
                       advantage: str = "normal") -> Dict[str, Any]:
+        """Sync wrapper for aprocess_attack"""
+        return self._run(self.aprocess_attack(attacker_name, target_name, weapon, attack_bonus,
+                                              damage_dice, advantage))
+    
+    async def aprocess_attack(self, attacker_name: str, target_name: str, weapon: str = "sword",
+                              attack_bonus: int = 5, damage_dice: str = "1d8+3",
+                              advantage: str = "normal") -> Dict[str, Any]:
         """
         Process a complete attack sequence with narrative
         
@@ -76,123 +214,241 @@ class TaleKeeper:
         """
         logger.info(f"{attacker_name} attacks {target_name} with {weapon}")
         
-        # Get characters
-        attacker = self.database.get_character_by_name(attacker_name)
-        target = self.database.get_character_by_name(target_name)
+        result, narrative_context, write = await self._resolve_attack(attacker_name, target_name, weapon,
+                                                                attack_bonus, damage_dice, advantage)
+        narration = self.lm_client.agenerate_combat_description(narrative_context)
+        
+        if write is None:
+            result.narrative = await narration
+        else:
+            # Apply and log the damage in a worker thread while the narrative generates
+            result.narrative, _ = await asyncio.gather(narration, self._db(write))
+        
+        logger.info(f"Attack result: {result.narrative}")
+        return dataclasses.asdict(result)
+    
+    async def _resolve_attack(self, attacker_name: str, target_name: str, weapon: str = "sword",
+                              attack_bonus: int = 5, damage_dice: str = "1d8+3", advantage: str = "normal"
+                              ) -> Tuple[AttackOutcome, Dict[str, Any], Optional[Callable[[], None]]]:
+        """
+        Look up both characters and roll the attack
+        
+        Returns (result, narrative context, write). write applies and logs the
+        damage, filling in the result's target HP; it is None on a miss.
+        """
+        # Get both characters in one query
+        found = await self._db(self.database.get_characters_by_names, [attacker_name, target_name])
+        attacker = found.get(attacker_name)
+        target = found.get(target_name)
         
         if not attacker or not target:
             missing = attacker_name if not attacker else target_name
             raise ValueError(f"Character not found: {missing}")
         
-        # Roll attack
-        adv_type = AdvantageType(advantage.lower())
+        # Roll attack and damage with the profile compiled for these stats
+        adv_type = parse_advantage(advantage)
         target_ac = target.ac
-        attack_result = self.dice_engine.calculate_attack(attack_bonus, target_ac, adv_type)
+        attack_result, damage = self.compile_attack_profile(attack_bonus, damage_dice)(target_ac, adv_type)
+        
+        result = AttackOutcome(
+            attacker=attacker_name,
+            target=target_name,
+            weapon=weapon,
+            hit=attack_result.hit,
+            attack_roll=attack_result.attack_roll.total,
+            target_ac=target_ac,
+            critical_hit=attack_result.critical_hit,
+            damage=damage if damage is not None else 0,
+            target_hp_before=target.hp_current,
+            target_hp_after=target.hp_current
+        )
         
-        result = {
+        # Narrative context; it only depends on the rolls, not the stored HP
+        narrative_context = {
             "attacker": attacker_name,
             "target": target_name,
             "weapon": weapon,
-            "hit": attack_result.hit,
-            "attack_roll": attack_result.attack_roll.total,
+            "hit": result.hit,
+            "critical": result.critical_hit,
+            "attack_roll": result.attack_roll,
             "target_ac": target_ac,
-            "critical_hit": attack_result.critical_hit,
-            "damage": 0,
-            "target_hp_before": target.hp_current,
-            "target_hp_after": target.hp_current,
-            "target_unconscious": False,
-            "narrative": ""
+            "damage": result.damage,
+            "unconscious": target.hp_current - result.damage <= 0
         }
         
-        # If hit, roll damage and apply it
-        if attack_result.hit:
-            if attack_result.critical_hit:
-                damage_result = self.dice_engine.roll_critical_damage(damage_dice)
-            else:
-                damage_result = self.dice_engine.roll_damage(damage_dice)
-            
-            damage_dealt = damage_result.total
-            result["damage"] = damage_dealt
+        write = None
+        if damage is not None:
+            write = functools.partial(self._apply_attack_damage, result, attacker, target, weapon,
+                                      attack_result, damage)
+        return result, narrative_context, write
+    
+    def compile_attack_profile(self, attack_bonus: int, damage_dice: str) -> AttackProfile:
+        """
+        Get the attack roller specialized for fixed stats, compiling it on first use
+        
+        The returned roll(target_ac, advantage) gives (attack_result, damage),
+        damage being None on a miss. The damage notation is parsed once here, and
+        damage is summed straight from the dice without building a DiceResult.
+        """
+        key = (attack_bonus, damage_dice)
+        profile = self._attack_profiles.get(key)
+        if profile is not None:
+            self._attack_profiles.move_to_end(key)
+            return profile
+        
+        count, sides, modifier = self.dice_engine.parse_dice_string(damage_dice)
+        critical_count = count * 2
+        calculate_attack = self.dice_engine.calculate_attack
+        roll_multiple = self.dice_engine.roll_multiple
+        
+        def roll(target_ac: int, advantage: AdvantageType) -> Tuple[AttackResult, Optional[int]]:
+            attack_result = calculate_attack(attack_bonus, target_ac, advantage)
+            if not attack_result.hit:
+                return attack_result, None
+            # Critical hits double the dice, not the modifier
+            dice = critical_count if attack_result.critical_hit else count
+            return attack_result, sum(roll_multiple(dice, sides)) + modifier
+        
+        self._attack_profiles[key] = roll
+        if len(self._attack_profiles) > ATTACK_PROFILE_CACHE_SIZE:
+            self._attack_profiles.popitem(last=False)
+        return roll
+    
+    def _apply_attack_damage(self, result: AttackOutcome, attacker: Character, target: Character, weapon: str,
+                             attack_result: AttackResult, damage_dealt: int):
+        """Apply an attack's damage, record the target's new HP in result and log it to the active encounter"""
+        success, new_hp = self.database.damage_character(target.id, damage_dealt)
+        if success:
+            result.target_hp_after = new_hp
+            result.target_unconscious = new_hp <= 0
             
-            # Apply damage to target
-            success, new_hp = self.database.damage_character(target.id, damage_dealt)
-            if success:
-                result["target_hp_after"] = new_hp
-                result["target_unconscious"] = new_hp <= 0
-                
-                # Log combat action
-                active_encounter = self.database.get_active_encounter()
-                if active_encounter:
-                    self.database.log_combat_action(
-                        active_encounter.id,
-                        attacker.id,
-                        "attack",
-                        f"{attacker_name} hits {target_name} for {damage_dealt} damage",
-                        {
-                            "attack_roll": attack_result.attack_roll.total,
-                            "damage_roll": damage_result.total,
-                            "weapon": weapon
-                        },
-                        damage_dealt,
-                        target.id,
-                        active_encounter.round_number
-                    )
-        
-        # Generate narrative description
-        narrative_context = {
-            "attacker": attacker_name,
-            "target": target_name,
-            "weapon": weapon,
-            "hit": result["hit"],
-            "critical": result["critical_hit"],
-            "attack_roll": result["attack_roll"],
-            "target_ac": target_ac,
-            "damage": result["damage"],
-            "unconscious": result["target_unconscious"]
-        }
+            active_encounter = self.database.get_active_encounter()
+            if active_encounter:
+                self.database.log_combat_action(
+                    active_encounter.id,
+                    attacker.id,
+                    "attack",
+                    f"{attacker.name} hits {target.name} for {damage_dealt} damage",
+                    {
+                        "attack_roll": attack_result.attack_roll.total,
+                        "damage_roll": damage_dealt,
+                        "weapon": weapon
+                    },
+                    damage_dealt,
+                    target.id,
+                    active_encounter.round_number
+                )
+    
+    async def astream_attack(self, attacker_name: str, target_name: str, weapon: str = "sword",
+                             attack_bonus: int = 5, damage_dice: str = "1d8+3",
+                             advantage: str = "normal") -> AsyncIterator[Dict[str, Any]]:
+        """
+        Process an attack like aprocess_attack, streaming the narrative as it generates
         
-        result["narrative"] = self.lm_client.generate_combat_description(narrative_context)
+        Yields {"message": text, "delta": True} per ~20ms of narrative, then
+        {"done": True, "result": result} once the damage has been stored.
+        """
+        logger.info(f"{attacker_name} attacks {target_name} with {weapon}")
         
-        logger.info(f"Attack result: {result['narrative']}")
-        return result
+        result, narrative_context, write = await self._resolve_attack(attacker_name, target_name, weapon,
+                                                                      attack_bonus, damage_dice, advantage)
+        
+        # Apply and log the damage in a worker thread while the narrative streams
+        stored = asyncio.ensure_future(self._db(write)) if write else None
+        
+        parts = []
+        try:
+            async for chunk in coalesce_chunks(self.lm_client.astream_combat_description(narrative_context)):
+                parts.append(chunk)
+                yield {"message": chunk, "delta": True}
+            result.narrative = "".join(parts).strip()
+        finally:
+            # Also when the consumer stops reading early, so a failed write still surfaces
+            if stored is not None:
+                await asyncio.shield(stored)
+        yield {"done": True, "result": dataclasses.asdict(result)}
+    
+    def process_round(self, attacks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Sync wrapper for aprocess_round"""
+        return self._run(self.aprocess_round(attacks))
+    
+    async def aprocess_round(self, attacks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Process a round of attacks in initiative order, narrating them as one batch
+        
+        Args:
+            attacks: Keyword arguments for aprocess_attack, one dict per attack
+                (attacker_name, target_name, and optionally weapon, attack_bonus,
+                damage_dice, advantage)
+        
+        Returns the attack results in the same order. Rolls and damage are
+        applied one attack at a time, so later attacks see earlier damage; the
+        narratives are all requested at the end and reach LM Studio together.
+        """
+        logger.info(f"Processing a round of {len(attacks)} attacks")
+        
+        results = []
+        narrative_contexts = []
+        for attack in attacks:
+            result, narrative_context, write = await self._resolve_attack(**attack)
+            if write is not None:
+                await self._db(write)
+            results.append(result)
+            narrative_contexts.append(narrative_context)
+        
+        narratives = await asyncio.gather(
+            *(self.lm_client.agenerate_combat_description(context) for context in narrative_contexts)
+        )
+        for result, narrative in zip(results, narratives):
+            result.narrative = narrative
+        
+        return [dataclasses.asdict(result) for result in results]
     
     def start_encounter(self, encounter_name: str, participant_names: List[str], 
                        description: str = "") -> Dict[str, Any]:
+        """Start a new combat encounter with initiative (sync wrapper for astart_encounter)"""
+        return self._run(self.astart_encounter(encounter_name, participant_names, description))
+    
+    async def astart_encounter(self, encounter_name: str, participant_names: List[str],
+                               description: str = "") -> Dict[str, Any]:
         """Start a new combat encounter with initiative"""
         logger.info(f"Starting encounter: {encounter_name}")
         
-        # Validate all participants exist
-        participants = []
+        # Validate all participants exist; a name listed twice still fights once
+        participant_names = list(dict.fromkeys(participant_names))
+        found = await self._db(self.database.get_characters_by_names, participant_names)
         for name in participant_names:
-            character = self.database.get_character_by_name(name)
-            if not character:
+            if name not in found:
                 raise ValueError(f"Character not found: {name}")
-            participants.append(character)
-        
-        # Create encounter
-        participant_ids = [char.id for char in participants]
-        encounter = self.database.create_encounter(encounter_name, description, participant_ids)
+        participants = [found[name] for name in participant_names]
+        self._precompute_save_odds(participants)
         
-        # Roll initiative for all participants
+        # Roll initiative for all participants in one draw
+        dex_mods = [character.modifiers.get('DEX', 0) for character in participants]
+        rolls, totals = self.dice_engine.roll_initiative_batch(dex_mods)
         initiative_order = []
-        for character in participants:
-            dex_mod = character.modifiers.get('DEX', 0)
-            initiative_roll = self.dice_engine.roll_initiative(dex_mod)
+        stored_order = []
+        for character, dex_mod, roll, total in zip(participants, dex_mods, rolls.tolist(), totals.tolist()):
             initiative_order.append({
                 "character": character.name,
-                "initiative": initiative_roll.total,
-                "roll": initiative_roll.rolls[0],
+                "initiative": total,
+                "roll": roll,
                 "modifier": dex_mod
             })
+            stored_order.append((character.id, total))
         
         # Sort by initiative (highest first)
         initiative_order.sort(key=lambda x: x["initiative"], reverse=True)
         
-        # Generate encounter start narrative
-        narrative = self.lm_client.generate_environment_description(
-            "combat encounter",
-            "tense",
-            [f"{char['character']} (Init: {char['initiative']})" for char in initiative_order]
+        # Store the encounter in a worker thread while the start narrative generates
+        participant_ids = [char.id for char in participants]
+        narrative, encounter = await asyncio.gather(
+            self.lm_client.agenerate_environment_description(
+                "combat encounter",
+                "tense",
+                [f"{char['character']} (Init: {char['initiative']})" for char in initiative_order]
+            ),
+            self._db(self.database.create_encounter, encounter_name, description, participant_ids, stored_order)
         )
         
         result = {
@@ -208,17 +464,54 @@ class TaleKeeper:
         logger.info(f"Encounter started: {narrative}")
         return result
     
+    def _precompute_save_odds(self, participants: List[Character]):
+        """Tabulate (participant, ability, DC) save odds for each advantage type"""
+        bonuses = [character.saving_throws.get(ability, 0)
+                   for character in participants for ability in _SAVE_INDEX]
+        shape = (len(participants), len(_SAVE_INDEX), len(_SAVE_DCS))
+        self._save_odds = {
+            adv_type: self.dice_engine.save_success_probability_table(bonuses, _SAVE_DCS, adv_type).reshape(shape)
+            for adv_type in AdvantageType
+        }
+        self._save_odds_index = {character.name: i for i, character in enumerate(participants)}
+    
+    def save_success_probability(self, character_name: str, save_type: str, dc: int,
+                                 advantage: str = "normal") -> float:
+        """
+        Chance a saving throw succeeds, without rolling it or generating narrative
+        
+        Participants of the current encounter are read from the table built when
+        it started; anyone else is looked up and computed on demand.
+        """
+        adv_type = parse_advantage(advantage)
+        ability = _SAVE_INDEX.get(save_type.upper())
+        index = self._save_odds_index.get(character_name)
+        if index is not None and ability is not None and _SAVE_DCS[0] <= dc <= _SAVE_DCS[-1]:
+            return float(self._save_odds[adv_type][index, ability, dc - _SAVE_DCS[0]])
+        
+        character = self.database.get_character_by_name(character_name)
+        if not character:
+            raise ValueError(f"Character not found: {character_name}")
+        
+        save_bonus = character.saving_throws.get(save_type.upper(), 0)
+        return float(self.dice_engine.save_success_probability_table([save_bonus], [dc], adv_type)[0, 0])
+    
     def process_saving_throw(self, character_name: str, save_type: str, dc: int, 
                            advantage: str = "normal") -> Dict[str, Any]:
+        """Process a saving throw with narrative (sync wrapper for aprocess_saving_throw)"""
+        return self._run(self.aprocess_saving_throw(character_name, save_type, dc, advantage))
+    
+    async def aprocess_saving_throw(self, character_name: str, save_type: str, dc: int,
+                                    advantage: str = "normal") -> Dict[str, Any]:
         """Process a saving throw with narrative"""
         logger.info(f"{character_name} makes a {save_type} saving throw (DC {dc})")
         
-        character = self.database.get_character_by_name(character_name)
+        character = await self._db(self.database.get_character_by_name, character_name)
         if not character:
             raise ValueError(f"Character not found: {character_name}")
         
         save_bonus = character.saving_throws.get(save_type.upper(), 0)
-        adv_type = AdvantageType(advantage.lower())
+        adv_type = parse_advantage(advantage)
         
         success, roll_result = self.dice_engine.calculate_saving_throw(save_bonus, dc, adv_type)
         
@@ -239,7 +532,7 @@ class TaleKeeper:
         
         # Use LM Studio for more detailed narrative
         situation = f"{character_name} rolling {save_type} save against DC {dc} and {outcome}"
-        detailed_narrative = self.lm_client.generate_npc_dialogue(
+        detailed_narrative = await self.lm_client.agenerate_npc_dialogue(
             "The Narrator",
             situation,
             "dramatic"
@@ -252,14 +545,19 @@ class TaleKeeper:
     
     def award_experience(self, character_names: List[str], xp_amount: int, 
                         source: str = "combat") -> Dict[str, Any]:
+        """Award experience points to multiple characters (sync wrapper for aaward_experience)"""
+        return self._run(self.aaward_experience(character_names, xp_amount, source))
+    
+    async def aaward_experience(self, character_names: List[str], xp_amount: int,
+                                source: str = "combat") -> Dict[str, Any]:
         """Award experience points to multiple characters"""
         logger.info(f"Awarding {xp_amount} XP to {len(character_names)} characters")
         
+        found = await self._db(self.database.get_character_ids_by_names, character_names)
+        
         results = []
         for name in character_names:
-            character = self.database.get_character_by_name(name)
-            if character:
-                self.database.add_experience(character.id, xp_amount, source)
+            if name in found:
                 results.append({
                     "character": name,
                     "xp_gained": xp_amount,
@@ -273,13 +571,16 @@ class TaleKeeper:
                     "error": "Character not found"
                 })
         
-        # Generate celebration narrative
-        success_names = [r["character"] for r in results if r["success"]]
-        if success_names:
-            narrative = self.lm_client.generate_npc_dialogue(
-                "The Narrator",
-                f"The party gains {xp_amount} experience points for their {source}",
-                "celebratory"
+        # Record the awards in a worker thread while the celebration narrative generates
+        awarded_ids = [found[name] for name in character_names if name in found]
+        if awarded_ids:
+            narrative, _ = await asyncio.gather(
+                self.lm_client.agenerate_npc_dialogue(
+                    "The Narrator",
+                    f"The party gains {xp_amount} experience points for their {source}",
+                    "celebratory"
+                ),
+                self._db(self.database.bulk_add_experience, awarded_ids, xp_amount, source)
             )
         else:
             narrative = "No experience was awarded."
@@ -296,29 +597,32 @@ class TaleKeeper:
     
     def get_party_status(self) -> Dict[str, Any]:
         """Get current status of all characters"""
-        characters = self.database.list_characters()
-        
-        party_status = []
-        for char in characters:
-            hp_percentage = (char.hp_current / char.hp_max) * 100
-            status = "healthy"
-            if hp_percentage <= 0:
-                status = "unconscious"
-            elif hp_percentage <= 25:
-                status = "critical"
-            elif hp_percentage <= 50:
-                status = "wounded"
-            
-            party_status.append({
-                "name": char.name,
-                "class": char.character_class,
-                "level": char.level,
-                "hp_current": char.hp_current,
-                "hp_max": char.hp_max,
-                "hp_percentage": round(hp_percentage, 1),
-                "status": status,
-                "ac": char.ac
-            })
+        party = self.database.list_characters_arrays()
+        
+        # Classify every character at once: <=0% unconscious, <=25% critical, <=50% wounded.
+        # A character with no max HP counts as 0% rather than dividing by zero.
+        hp_max = party["hp_max"]
+        hp_percentage = np.divide(party["hp_current"] * 100.0, hp_max,
+                                  out=np.zeros(hp_max.shape), where=hp_max > 0)
+        status = _PARTY_STATUS[np.digitize(hp_percentage, _PARTY_STATUS_BINS, right=True)]
+        
+        party_status = [
+            {
+                "name": name,
+                "class": character_class,
+                "level": level,
+                "hp_current": hp_current,
+                "hp_max": hp_max,
+                "hp_percentage": round(pct, 1),
+                "status": char_status,
+                "ac": ac
+            }
+            for name, character_class, level, hp_current, hp_max, pct, char_status, ac in zip(
+                party["name"].tolist(), party["character_class"].tolist(), party["level"].tolist(),
+                party["hp_current"].tolist(), party["hp_max"].tolist(), hp_percentage.tolist(),
+                status.tolist(), party["ac"].tolist()
+            )
+        ]
         
         return {
             "party_size": len(party_status),
@@ -370,15 +674,18 @@ async def main():
         'alignment': 'Chaotic Good'
     }
     
-    thorin = talekeeper.create_character(thorin_data)
-    elara = talekeeper.create_character(elara_data)
+    # Concurrent calls share one narration batch
+    thorin, elara = await asyncio.gather(
+        talekeeper.acreate_character(thorin_data),
+        talekeeper.acreate_character(elara_data)
+    )
     
     print(f"Created: {thorin.name} (Fighter, {thorin.hp_current}/{thorin.hp_max} HP)")
     print(f"Created: {elara.name} (Wizard, {elara.hp_current}/{elara.hp_max} HP)")
     
     # Start an encounter
     print("\n2. Starting Combat Encounter...")
-    encounter = talekeeper.start_encounter(
+    encounter = await talekeeper.astart_encounter(
         "Goblin Ambush",
         ["Thorin Ironbeard", "Elara Moonwhisper"],
         "The party encounters goblins on the forest road"
@@ -389,7 +696,7 @@ async def main():
     
     # Process an attack
     print("\n3. Combat Action...")
-    attack_result = talekeeper.process_attack(
+    attack_result = await talekeeper.aprocess_attack(
         "Thorin Ironbeard",
         "Elara Moonwhisper",  # Friendly fire for demo
         "longsword",
@@ -401,7 +708,7 @@ async def main():
     
     # Saving throw
     print("\n4. Saving Throw...")
-    save_result = talekeeper.process_saving_throw(
+    save_result = await talekeeper.aprocess_saving_throw(
         "Elara Moonwhisper",
         "dex",
         15,
@@ -411,7 +718,7 @@ async def main():
     
     # Award XP
     print("\n5. Experience Award...")
-    xp_result = talekeeper.award_experience(
+    xp_result = await talekeeper.aaward_experience(
         ["Thorin Ironbeard", "Elara Moonwhisper"],
         200,
         "combat"
@@ -429,6 +736,8 @@ async def main():
     quest = talekeeper.generate_quest_hook("mystery", "medium")
     print(f"Quest: {quest}")
     
+    await talekeeper.aclose()
+    
     print("\n=== Demo Complete ===")
 
 
@@ -3,39 +3,70 @@ Test script for TaleKeeper system components.
 Tests dice engine, database, and basic orchestration.
 """
 
+import asyncio
 import sys
 from pathlib import Path
 
+import numpy as np
+import requests
+
 # Add core directory to path
 sys.path.append(str(Path(__file__).parent / "core"))
 sys.path.append(str(Path(__file__).parent / "flows"))
 
 from dice_engine import DiceEngine, AdvantageType
 from database import DatabaseManager
-from lm_studio_client import LMStudioClient
-from talekeeper import TaleKeeper
+from lm_studio_client import LMStudioClient, SemanticCache, coalesce_chunks, NARRATION_STOP_CHARS
+from talekeeper import TaleKeeper, ATTACK_PROFILE_CACHE_SIZE
 
 
 def test_dice_engine():
     """Test the dice engine functionality"""
     print("=== Testing Dice Engine ===")
     
-    dice = DiceEngine()
-    
-    # Test basic d20 roll
-    result = dice.roll_d20(5)
-    print(f"d20 + 5: {result.description} = {result.total}")
-    assert 6 <= result.total <= 25, f"d20+5 should be 6-25, got {result.total}"
+    dice = DiceEngine(seed=0)
     
-    # Test advantage
+    # Test single d20 rolls, drawn from the engine's pre-drawn uniform block
+    totals = [dice.roll_d20(5).total for _ in range(5000)]
+    assert set(totals) == set(range(6, 26)), "d20+5 should cover exactly 6-25"
     result = dice.roll_d20(3, AdvantageType.ADVANTAGE)
+    assert 4 <= result.total <= 23, f"d20+3 should be 4-23, got {result.total}"
     print(f"d20 + 3 (Advantage): {result.description} = {result.total}")
     
+    # Test d20 rolls as one seeded batch
+    rolls = dice.roll_d20_batch(5, n=100_000)
+    np.testing.assert_array_less([5, rolls.max()], [rolls.min(), 26])
+    assert np.array_equal(np.unique(rolls), np.arange(6, 26)), "d20+5 should hit every total from 6-25"
+    print(f"d20 + 5: 100k rolls, mean {rolls.mean():.2f}")
+    
+    # Test advantage and disadvantage shift the mean
+    advantage = dice.roll_d20_batch(3, n=100_000, advantage=AdvantageType.ADVANTAGE)
+    disadvantage = dice.roll_d20_batch(3, n=100_000, advantage=AdvantageType.DISADVANTAGE)
+    assert disadvantage.mean() < 13.5 < advantage.mean(), "Advantage should raise and disadvantage lower the mean"
+    print(f"d20 + 3: advantage mean {advantage.mean():.2f}, disadvantage mean {disadvantage.mean():.2f}")
+    
+    # Test save odds table against the sampled rolls
+    odds = dice.save_success_probability_table([3], [14], AdvantageType.ADVANTAGE)
+    assert odds.shape == (1, 1) and abs(odds[0, 0] - (advantage >= 14).mean()) < 0.01, "Save odds disagree with rolls"
+    print(f"Save odds (+3 vs DC 14, advantage): {odds[0, 0]:.4f}")
+    
     # Test damage roll
     damage = dice.roll_damage("2d6+3")
     print(f"Damage: {damage.description} = {damage.total}")
     assert 5 <= damage.total <= 15, f"2d6+3 should be 5-15, got {damage.total}"
     
+    try:
+        dice.roll_damage("1d0")
+        assert False, "1d0 should be rejected"
+    except ValueError:
+        pass
+    
+    # Test batch damage rolls
+    batch = dice.roll_damage_batch("2d6+3", 100_000)
+    np.testing.assert_array_less([4, batch.max()], [batch.min(), 16])
+    assert abs(batch.mean() - 10) < 0.05, f"2d6+3 should average 10, got {batch.mean():.2f}"
+    print(f"Batch damage: 100k x 2d6+3, mean {batch.mean():.2f}")
+    
     # Test attack
     attack = dice.calculate_attack(8, 15)
     print(f"Attack (+8 vs AC 15): {attack.attack_roll.description} = {'HIT' if attack.hit else 'MISS'}")
@@ -80,10 +111,40 @@ def test_database():
     assert success, "Failed to apply healing"
     print(f"Applied 3 healing: {new_hp} -> {healed_hp}")
     
+    # Test bulk party creation
+    party = db.create_characters_bulk([
+        {'name': 'Bulk Fighter', 'player_name': 'Test Player', 'character_class': 'Fighter', 'hp_max': 12},
+        {'name': 'Bulk Cleric', 'player_name': 'Test Player', 'character_class': 'Cleric', 'hp_max': 10},
+    ])
+    assert len(party) == 2, "Bulk creation should return every character"
+    assert db.get_character(party[1].id) is not None, "Bulk-created character not stored"
+    print(f"Bulk created: {', '.join(c.name for c in party)}")
+    
+    # Test batched name lookup
+    found = db.get_characters_by_names(['Bulk Fighter', 'Bulk Cleric', 'Nobody'])
+    assert set(found) == {'Bulk Fighter', 'Bulk Cleric'}, f"Unexpected lookup result: {list(found)}"
+    assert found['Bulk Cleric'].id == party[1].id, "Name lookup returned the wrong character"
+    assert db.get_character_ids_by_names(['Bulk Fighter', 'Nobody']) == {'Bulk Fighter': party[0].id}, \
+        "ID lookup returned an unexpected result"
+    
     # Test encounter creation
     encounter = db.create_encounter("Test Fight", "Testing encounter", [character.id])
     print(f"Created encounter: {encounter.name} (ID: {encounter.id[:8]}...)")
     
+    # Test the newest of several active encounters is the current one
+    for i in range(5):
+        latest = db.create_encounter(f"Test Fight {i}", "Testing encounter", [character.id])
+    assert db.get_active_encounter().id == latest.id, "Active encounter should be the newest"
+    
+    # Test combat log rejects unknown references without losing staged rows
+    db.log_combat_action(encounter.id, character.id, "attack", "Test swing")
+    try:
+        db.log_combat_action("no-such-encounter", character.id, "attack", "Bad swing")
+        assert False, "Logging against an unknown encounter should raise"
+    except ValueError:
+        pass
+    assert len(db.get_combat_log(encounter.id)) == 1, "Valid combat log row was lost"
+    
     # Test experience
     xp_entry = db.add_experience(character.id, 100, "testing")
     print(f"Added 100 XP from {xp_entry.source}")
@@ -124,6 +185,73 @@ def test_lm_studio_client():
     damage_desc = client.generate_damage_description(damage_context)
     print(f"Damage description: {damage_desc}")
     
+    # Test semantic cache reuses a narration for a different character
+    cache = SemanticCache()
+    miss = {"hit": False, "attack_roll": 4, "target_ac": 15}
+    cache.put(client._combat_prompt({**miss, "attacker": "Thorin"}), "Thorin", "Thorin swings wide.", "combat")
+    reused = cache.get(client._combat_prompt({**miss, "attacker": "Elara"}), "Elara", "combat")
+    assert reused == "Elara swings wide.", f"Expected cached narration for Elara, got {reused}"
+    assert cache.get(client._combat_prompt({**miss, "attacker": "Elara"}), "Elara", "damage") is None, \
+        "Semantic cache hit crossed narration kinds"
+    print(f"Semantic cache hit: {reused}")
+    
+    # Test entity names are only substituted as whole words
+    cache = SemanticCache()
+    cache.put(client._combat_prompt({**miss, "attacker": "Bat"}), "Bat", "Battle-weary Bat swings wide.", "combat")
+    reused = cache.get(client._combat_prompt({**miss, "attacker": "Thorin"}), "Thorin", "combat")
+    assert reused == "Battle-weary Thorin swings wide.", f"Entity substituted inside a word: {reused}"
+    
+    # Test damage of a different type never reuses a narration
+    fire = {"character": "Thorin", "damage": 16, "damage_type": "fire", "old_hp": 20, "new_hp": 4}
+    cold = {**fire, "character": "Elara", "damage_type": "cold"}
+    cache.put(client._damage_prompt(fire), "Thorin", "Flames lick at Thorin.", client._damage_namespace(fire))
+    assert cache.get(client._damage_prompt(cold), "Elara", client._damage_namespace(cold)) is None, \
+        "Fire damage narration reused for cold damage"
+    potion = {"character": "Thorin", "healing": 10, "heal_type": "potion", "old_hp": 4, "new_hp": 14, "max_hp": 20}
+    magical = {**potion, "character": "Elara", "heal_type": "magical"}
+    cache.put(client._healing_prompt(potion), "Thorin", "Thorin drains the vial.", client._healing_namespace(potion))
+    assert cache.get(client._healing_prompt(magical), "Elara", client._healing_namespace(magical)) is None, \
+        "Potion healing narration reused for magical healing"
+    
+    # Test coalesced streams flush held text on time even when the source stalls
+    async def stalled_stream():
+        yield "a"
+        yield "b"
+        await asyncio.sleep(0.3)
+        yield "c"
+    
+    async def timed_chunks():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        return [(chunk, loop.time() - start) async for chunk in coalesce_chunks(stalled_stream())]
+    
+    timed = asyncio.run(timed_chunks())
+    assert [chunk for chunk, _ in timed] == ["a", "b", "c"], f"Unexpected coalesced chunks: {timed}"
+    assert timed[1][1] < 0.2, f"Held text waited for the stalled source: {timed}"
+    
+    # Test a failed request falls back without caching the fallback text
+    client = LMStudioClient("http://127.0.0.1:9")
+    client._server_down = lambda: False
+    
+    def refused(*args, **kwargs):
+        raise requests.exceptions.ConnectionError("refused")
+    
+    client.session.post = refused
+    fallback = client.generate_combat_description(context)
+    assert fallback == client._fallback_response(client._combat_prompt(context)), f"Unexpected fallback: {fallback}"
+    assert not client._cache, "Fallback text was cached"
+    
+    # Test the exact cache serves a repeated prompt without an HTTP request
+    def unexpected(*args, **kwargs):
+        raise AssertionError("Cached narration was requested again")
+    
+    key = client._cache_key(client._combat_prompt(context), 100, 0.8, NARRATION_STOP_CHARS)
+    client._cache_put(key, "Test Hero", client._combat_namespace(context), ["Test Hero strikes true."])
+    client.session.post = unexpected
+    assert client.generate_combat_description(context) == "Test Hero strikes true."
+    assert client.generate_combat_description(context) == "Test Hero strikes true."
+    client.close()
+    
     print("[PASS] LM Studio client tests passed!\n")
 
 
@@ -159,6 +287,62 @@ def test_talekeeper_integration():
     save_result = talekeeper.process_saving_throw("Integration Hero", "wis", 12)
     print(f"Saving throw: {save_result['success']} (rolled {save_result['roll_total']})")
     
+    # Test sync wrappers still work when called from a running event loop
+    async def save_from_loop():
+        return talekeeper.process_saving_throw("Integration Hero", "con", 10)
+    
+    save_result = asyncio.run(save_from_loop())
+    assert save_result["save_type"] == "CON", "Sync wrapper failed inside an event loop"
+    print(f"Saving throw from event loop: {save_result['success']} (rolled {save_result['roll_total']})")
+    
+    # Test a participant listed twice joins the encounter once, with its initiative stored
+    encounter_result = talekeeper.start_encounter("Duplicate Test", ["Integration Hero", "Integration Hero"])
+    stored = talekeeper.database.get_initiative_order(encounter_result["encounter_id"])
+    assert len(stored) == 1 and len(encounter_result["initiative_order"]) == 1, "Duplicate participant mishandled"
+    
+    # Test save odds match the d20 formula (ignoring natural 1s and 20s)
+    character = talekeeper.database.get_character_by_name("Integration Hero")
+    for save_type, bonus in character.saving_throws.items():
+        for dc in (5, 12, 20, 30):
+            odds = talekeeper.save_success_probability("Integration Hero", save_type, dc)
+            expected = np.clip((21 + bonus - dc) / 20, 0, 1)
+            assert np.isclose(odds, expected), f"{save_type} DC {dc}: {odds} != {expected}"
+    
+    # Test compiled attack profiles roll damage within the dice bounds, and the cache stays capped
+    profile = talekeeper.compile_attack_profile(5, "2d6+3")
+    for _ in range(2000):
+        attack, damage = profile(15, AdvantageType.NORMAL)
+        if not attack.hit:
+            assert damage is None, "A miss rolled damage"
+        elif attack.critical_hit:
+            assert 7 <= damage <= 27, f"Critical 2d6+3 out of bounds: {damage}"
+        else:
+            assert 5 <= damage <= 15, f"2d6+3 out of bounds: {damage}"
+    for bonus in range(ATTACK_PROFILE_CACHE_SIZE + 10):
+        talekeeper.compile_attack_profile(bonus, "1d4")
+    assert len(talekeeper._attack_profiles) == ATTACK_PROFILE_CACHE_SIZE, "Attack profile cache grew past its cap"
+    assert (5, "2d6+3") not in talekeeper._attack_profiles, "Least recently used profile was not evicted"
+    
+    # Test a round applies each attack's damage before the next one rolls
+    attack = {"attacker_name": "Integration Hero", "target_name": "Integration Hero", "attack_bonus": 10}
+    results = talekeeper.process_round([attack] * 3)
+    for earlier, later in zip(results, results[1:]):
+        assert later["target_hp_before"] == earlier["target_hp_after"], f"Round HP out of order: {results}"
+    assert results[-1]["target_hp_after"] == talekeeper.database.get_character_by_name("Integration Hero").hp_current
+    
+    # Test a superseded run_latest call is cancelled while the latest completes
+    async def superseded():
+        first = asyncio.ensure_future(talekeeper.run_latest("attack", asyncio.sleep(1, "first")))
+        await asyncio.sleep(0)
+        second = await talekeeper.run_latest("attack", asyncio.sleep(0, "second"))
+        try:
+            await first
+        except asyncio.CancelledError:
+            return second
+        raise AssertionError("Superseded run_latest call was not cancelled")
+    
+    assert asyncio.run(superseded()) == "second"
+    
     # Test XP award
     xp_result = talekeeper.award_experience(["Integration Hero"], 50, "testing")
     print(f"XP awarded: {xp_result['total_xp']} points")